@@ -0,0 +1,1072 @@
+import os
+import sys
+import argparse
+import time
+import json
+import shutil
+import tempfile
+import statistics
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from PIL import Image
+
+from image_cache import CaptionCache
+from image_processor import PropertyImageProcessor, read_image_header
+
+
+def make_synthetic_photo(width: int, height: int, seed: int = 0) -> Image.Image:
+    # Smooth gradients plus sensor-like noise, so JPEG sizes and encode times
+    # resemble real listing photos rather than flat test patterns. Rows are
+    # generated in bands so a 50 MP frame needs no full-size float buffer.
+    rng = np.random.default_rng(seed)
+    x = np.linspace(0, 1, width, dtype=np.float32)[None, :]
+    y_all = np.linspace(0, 1, height, dtype=np.float32)
+
+    output = np.empty((height, width, 3), dtype=np.uint8)
+    for top in range(0, height, 512):
+        y = y_all[top:top + 512, None]
+        band = np.empty((y.shape[0], width, 3), dtype=np.float32)
+        band[..., 0] = 60 + 140 * x + 30 * np.sin(8 * y + seed)
+        band[..., 1] = 70 + 110 * y + 25 * np.cos(6 * x + seed)
+        band[..., 2] = 90 + 80 * (1 - x) * y
+        band += rng.normal(0, 6, size=(y.shape[0], width, 1)).astype(np.float32)
+        output[top:top + 512] = np.clip(band, 0, 255)
+
+    return Image.fromarray(output, 'RGB')
+
+
+def write_synthetic_images(directory: str, count: int, size: Tuple[int, int], fmt: str = 'JPEG') -> List[str]:
+    os.makedirs(directory, exist_ok=True)
+    extension = {'JPEG': '.jpg', 'PNG': '.png', 'WEBP': '.webp'}[fmt]
+
+    paths = []
+    for index in range(count):
+        path = os.path.join(directory, f"synthetic_{size[0]}x{size[1]}_{index}{extension}")
+        make_synthetic_photo(size[0], size[1], seed=index).save(path, fmt, quality=92)
+        paths.append(path)
+    return paths
+
+
+def _time_calls(func, paths: List[str]) -> List[float]:
+    timings = []
+    for path in paths:
+        start = time.perf_counter()
+        func(path)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def _summarize(timings: List[float]) -> dict:
+    return {
+        'images': len(timings),
+        'mean_ms': round(statistics.mean(timings) * 1000, 1),
+        'median_ms': round(statistics.median(timings) * 1000, 1),
+        'images_per_sec': round(len(timings) / sum(timings), 2)
+    }
+
+
+def benchmark_pipeline_modes(count: int = 5, size: Tuple[int, int] = (4032, 3024)) -> dict:
+    work_dir = tempfile.mkdtemp(prefix='realtygenie_bench_')
+    try:
+        paths = write_synthetic_images(os.path.join(work_dir, 'input'), count, size)
+        output_dir = os.path.join(work_dir, 'output')
+        os.makedirs(output_dir)
+
+        results = {}
+        for pipeline in ('multi_pass', 'single_pass'):
+            processor = PropertyImageProcessor(pipeline=pipeline)
+
+            def run(path, processor=processor, pipeline=pipeline):
+                output_path = os.path.join(output_dir, f"{pipeline}_{os.path.basename(path)}")
+                metadata = processor.process_image(path, output_path)
+                if metadata['status'] != 'success':
+                    raise RuntimeError(metadata['error'])
+
+            results[pipeline] = _summarize(_time_calls(run, paths))
+
+        saved = results['multi_pass']['mean_ms'] - results['single_pass']['mean_ms']
+        results['saved_per_image_ms'] = round(saved, 1)
+        results['input_size'] = list(size)
+        return results
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def compare_enhancement_engines(image: Image.Image, enhancement_level: str = 'medium') -> dict:
+    chain = PropertyImageProcessor(enhancement_engine='chain')._apply_enhancements(image, enhancement_level)
+    fused = PropertyImageProcessor(enhancement_engine='fused')._apply_enhancements(image, enhancement_level)
+
+    difference = np.abs(np.asarray(chain, dtype=np.int16) - np.asarray(fused, dtype=np.int16))
+    return {
+        'mean_abs_error': round(float(difference.mean()), 2),
+        'p99_abs_error': int(np.percentile(difference, 99)),
+        'max_abs_error': int(difference.max())
+    }
+
+
+def _run_engine_memory_case(size: Tuple[int, int], engine: str, enhancement_level: str) -> Optional[float]:
+    # Runs in a fresh process; the photo is built before the high-water mark
+    # is reset, so the delta is what the enhancement steps needed.
+    image = make_synthetic_photo(size[0], size[1], seed=0)
+    processor = PropertyImageProcessor(enhancement_engine=engine)
+    _reset_peak_rss()
+    baseline = _peak_rss_mb()
+    processor._apply_enhancements(image, enhancement_level)
+    peak = _peak_rss_mb()
+    return round(peak - baseline, 1) if peak is not None else None
+
+
+def measure_enhancement_memory(size: Tuple[int, int] = (4032, 3024), enhancement_level: str = 'medium') -> dict:
+    from concurrent.futures import ProcessPoolExecutor
+    from multiprocessing import get_context
+
+    results = {}
+    for engine in ('chain', 'fused'):
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as executor:
+            results[engine] = executor.submit(_run_engine_memory_case, size, engine, enhancement_level).result()
+    return results
+
+
+def benchmark_enhancement_engines(count: int = 3, size: Tuple[int, int] = (4032, 3024),
+                                  max_mean_error: float = 2.3, max_abs_error: int = 12) -> dict:
+    images = [make_synthetic_photo(size[0], size[1], seed=index) for index in range(count)]
+    results = {'input_size': list(size)}
+
+    for engine in ('chain', 'fused'):
+        processor = PropertyImageProcessor(enhancement_engine=engine)
+        timings = []
+        for image in images:
+            start = time.perf_counter()
+            processor._apply_enhancements(image, 'medium')
+            timings.append(time.perf_counter() - start)
+        results[engine] = _summarize(timings)
+
+    errors = {}
+    for level in ('light', 'medium', 'strong', 'auto'):
+        errors[level] = compare_enhancement_engines(images[0], level)
+    results['pixel_difference'] = errors
+    results['peak_memory_mb'] = measure_enhancement_memory(size)
+    results['within_tolerance'] = all(
+        error['mean_abs_error'] <= max_mean_error and error['max_abs_error'] <= max_abs_error
+        for error in errors.values()
+    )
+    return results
+
+
+def benchmark_stage_orders(count: int = 2, sizes: Tuple[Tuple[int, int], ...] = ((4000, 3000), (8192, 6144))) -> dict:
+    work_dir = tempfile.mkdtemp(prefix='realtygenie_bench_')
+    try:
+        results = {}
+        for size in sizes:
+            paths = write_synthetic_images(os.path.join(work_dir, 'input'), count, size)
+            output_path = os.path.join(work_dir, 'output.jpg')
+
+            size_results = {}
+            for stage_order in ('enhance_first', 'resize_first'):
+                processor = PropertyImageProcessor(stage_order=stage_order)
+                size_results[stage_order] = _summarize(
+                    _time_calls(lambda path: processor.process_image(path, output_path), paths)
+                )
+
+            size_results['speedup'] = round(
+                size_results['enhance_first']['mean_ms'] / size_results['resize_first']['mean_ms'], 1
+            )
+            results[f"{size[0]}x{size[1]}"] = size_results
+        return results
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def benchmark_batch_workers(count: int = 16, size: Tuple[int, int] = (4000, 3000),
+                            worker_counts: Optional[Tuple[int, ...]] = None) -> dict:
+    cpu_count = os.cpu_count() or 1
+    worker_counts = worker_counts or tuple(sorted({1, 2, 4, 8, 16, cpu_count} & set(range(1, cpu_count + 1))))
+
+    work_dir = tempfile.mkdtemp(prefix='realtygenie_bench_')
+    try:
+        input_dir = os.path.join(work_dir, 'input')
+        write_synthetic_images(input_dir, count, size)
+        processor = PropertyImageProcessor(stage_order='resize_first')
+
+        results = {'cpu_count': cpu_count, 'images': count}
+        baseline = None
+        for workers in worker_counts:
+            start = time.perf_counter()
+            processor.process_batch(input_dir, os.path.join(work_dir, f"output_{workers}"), workers=workers)
+            elapsed = time.perf_counter() - start
+
+            baseline = baseline or elapsed
+            results[f"workers_{workers}"] = {
+                'seconds': round(elapsed, 2),
+                'images_per_sec': round(count / elapsed, 2),
+                'speedup': round(baseline / elapsed, 2)
+            }
+        return results
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def benchmark_quality_search(count: int = 8, size: Tuple[int, int] = (4000, 3000),
+                             target_file_size: int = 100 * 1024) -> dict:
+    work_dir = tempfile.mkdtemp(prefix='realtygenie_bench_')
+    try:
+        paths = write_synthetic_images(os.path.join(work_dir, 'input'), count, size)
+        output_path = os.path.join(work_dir, 'output.jpg')
+        processor = PropertyImageProcessor(quality=95, stage_order='resize_first',
+                                           target_file_size=target_file_size)
+
+        results = {'target_file_size': target_file_size}
+        for run in ('first_upload', 'repeat_upload'):
+            encodes, qualities, timings = [], [], []
+            for path in paths:
+                start = time.perf_counter()
+                metadata = processor.process_image(path, output_path)
+                timings.append(time.perf_counter() - start)
+                encodes.append(metadata['quality_search_encodes'])
+                qualities.append(metadata['encode_quality'])
+
+            results[run] = _summarize(timings)
+            results[run]['mean_encodes'] = round(statistics.mean(encodes), 2)
+            results[run]['max_encodes'] = max(encodes)
+            results[run]['mean_quality'] = round(statistics.mean(qualities), 1)
+        return results
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def benchmark_output_encoders(count: int = 3, size: Tuple[int, int] = (1080, 810),
+                              qualities: Tuple[int, ...] = (60, 75, 85, 95)) -> dict:
+    processor = PropertyImageProcessor()
+    images = [make_synthetic_photo(size[0], size[1], seed=index) for index in range(count)]
+
+    table = []
+    for output_format in processor.supported_output_formats():
+        for quality in qualities:
+            timings, sizes = [], []
+            for image in images:
+                start = time.perf_counter()
+                data = processor._encode(image, output_format, quality)
+                timings.append(time.perf_counter() - start)
+                sizes.append(len(data))
+
+            table.append({
+                'format': output_format,
+                'quality': quality,
+                'encode_ms': round(statistics.mean(timings) * 1000, 1),
+                'size_kb': round(statistics.mean(sizes) / 1024, 1)
+            })
+
+    print(f"{'format':<8}{'quality':>8}{'encode_ms':>12}{'size_kb':>10}")
+    for row in table:
+        print(f"{row['format']:<8}{row['quality']:>8}{row['encode_ms']:>12}{row['size_kb']:>10}")
+
+    unsupported = sorted(set(processor.output_encoders) - set(processor.supported_output_formats()))
+    return {'image_size': list(size), 'unsupported': unsupported, 'table': table}
+
+
+def benchmark_header_reads(count: int = 1000, size: Tuple[int, int] = (1600, 1200)) -> dict:
+    work_dir = tempfile.mkdtemp(prefix='realtygenie_bench_')
+    try:
+        template = os.path.join(work_dir, 'template.jpg')
+        make_synthetic_photo(size[0], size[1]).save(template, 'JPEG', quality=90)
+        paths = []
+        for index in range(count):
+            path = os.path.join(work_dir, f"photo_{index}.jpg")
+            shutil.copyfile(template, path)
+            paths.append(path)
+
+        def decode(path):
+            with Image.open(path) as image:
+                return image.convert('RGB').size
+
+        results = {'files': count, 'image_size': list(size)}
+        for name, reader in (('full_decode', decode), ('header_only', read_image_header)):
+            start = time.perf_counter()
+            for path in paths:
+                reader(path)
+            elapsed = time.perf_counter() - start
+            results[name] = {
+                'total_ms': round(elapsed * 1000, 1),
+                'per_file_us': round(elapsed / count * 1e6, 1)
+            }
+
+        results['speedup'] = round(results['full_decode']['total_ms'] / results['header_only']['total_ms'], 1)
+        return results
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def benchmark_auto_enhancement(count: int = 6, size: Tuple[int, int] = (4032, 3024)) -> dict:
+    # Dim interiors with a blown window next to bright exteriors: the case
+    # the fixed profiles get wrong in opposite directions.
+    work_dir = tempfile.mkdtemp(prefix='realtygenie_bench_')
+    try:
+        input_dir = os.path.join(work_dir, 'input')
+        os.makedirs(input_dir)
+        for index in range(count):
+            pixels = np.asarray(make_synthetic_photo(size[0], size[1], seed=index), dtype=np.float32)
+            if index % 2:
+                pixels = pixels * 0.45 + 140
+            else:
+                pixels *= 0.3
+                pixels[size[1] // 8:size[1] // 3, size[0] // 6:size[0] // 3] = 250
+            Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8)).save(
+                os.path.join(input_dir, f"{'bright' if index % 2 else 'dark'}_{index}.jpg"), quality=92)
+
+        results = {}
+        for level in ('medium', 'auto'):
+            processor = PropertyImageProcessor()
+            start = time.perf_counter()
+            batch = processor.process_batch(input_dir, os.path.join(work_dir, level), level)
+            elapsed = time.perf_counter() - start
+
+            medians = {'dark': [], 'bright': []}
+            for filename, metadata in batch['results'].items():
+                with Image.open(metadata['output_path']) as output:
+                    medians[filename.split('_')[0]].append(float(np.median(np.asarray(output.convert('L')))))
+            results[level] = {
+                'batch_ms': round(elapsed * 1000, 1),
+                'auto_profile_ms': round(sum(metadata['stage_timings_ms'].get('auto_profile', 0)
+                                             for metadata in batch['results'].values()), 1),
+                'median_luminance': {kind: round(statistics.mean(values), 1) for kind, values in medians.items()}
+            }
+
+        results['auto_overhead'] = f"{results['auto']['auto_profile_ms'] / results['auto']['batch_ms'] * 100:.2f}%"
+        return results
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def benchmark_duplicate_detection(shots: int = 6, size: Tuple[int, int] = (4000, 3000)) -> dict:
+    # Each shot gets a recompressed re-export and a slightly shifted burst
+    # frame; a 'reuse' batch should then process one image per shot.
+    from image_dedup import group_near_duplicates
+
+    work_dir = tempfile.mkdtemp(prefix='realtygenie_bench_')
+    try:
+        input_dir = os.path.join(work_dir, 'input')
+        os.makedirs(input_dir)
+        for shot in range(shots):
+            photo = make_synthetic_photo(size[0], size[1], seed=shot)
+            photo.save(os.path.join(input_dir, f"shot{shot}_a.jpg"), quality=92)
+            photo.save(os.path.join(input_dir, f"shot{shot}_b_reexport.jpg"), quality=70)
+            photo.crop((20, 15, size[0], size[1])).save(os.path.join(input_dir, f"shot{shot}_c_burst.jpg"), quality=92)
+        paths = [os.path.join(input_dir, name) for name in sorted(os.listdir(input_dir))]
+
+        processor = PropertyImageProcessor(stage_order='resize_first')
+
+        def decode(path):
+            with Image.open(path) as image:
+                return image.convert('RGB').size
+
+        start = time.perf_counter()
+        hashes = {os.path.basename(path): processor.perceptual_hash(path) for path in paths}
+        hash_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        duplicates = group_near_duplicates(hashes, processor.duplicate_threshold)
+        group_seconds = time.perf_counter() - start
+        decode_timings = _time_calls(decode, paths)
+
+        batches = {}
+        for mode in (None, 'reuse'):
+            start = time.perf_counter()
+            processor.process_batch(input_dir, os.path.join(work_dir, f"output_{mode}"), duplicates=mode)
+            batches[mode or 'process_all'] = round((time.perf_counter() - start) * 1000, 1)
+
+        return {
+            'images': len(paths),
+            'near_duplicates_found': len(duplicates),
+            'expected_duplicates': shots * 2,
+            'hash_ms_per_image': round(hash_seconds / len(paths) * 1000, 2),
+            'full_decode_ms_per_image': round(statistics.mean(decode_timings) * 1000, 2),
+            'grouping_ms': round(group_seconds * 1000, 3),
+            'batch_ms': batches
+        }
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def benchmark_frame_memo(count: int = 4, size: Tuple[int, int] = (4032, 3024), frame_memo_mb: float = 512) -> dict:
+    # The Streamlit flow: process uploads, then move the quality slider or
+    # switch the enhancement level and reprocess the same files.
+    work_dir = tempfile.mkdtemp(prefix='realtygenie_bench_')
+    try:
+        paths = write_synthetic_images(os.path.join(work_dir, 'input'), count, size)
+        output_dir = os.path.join(work_dir, 'output')
+        os.makedirs(output_dir)
+        results = {'images': count}
+        for stage_order in ('enhance_first', 'resize_first'):
+            processor = PropertyImageProcessor(stage_order=stage_order, frame_memo_mb=frame_memo_mb)
+            timings = {}
+            for run, quality, level in (('cold', 85, 'medium'), ('quality_change', 70, 'medium'),
+                                        ('enhancement_change', 70, 'strong')):
+                processor.quality = quality
+                start = time.perf_counter()
+                for path in paths:
+                    processor.process_image(path, os.path.join(output_dir, os.path.basename(path)), level)
+                timings[f"{run}_ms_per_image"] = round((time.perf_counter() - start) / count * 1000, 1)
+            timings['memo_mb'] = round(processor._frame_memo_bytes / (1024 * 1024), 1)
+            results[stage_order] = timings
+        return results
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def benchmark_smart_crop(count: int = 20, size: Tuple[int, int] = (4032, 3024)) -> dict:
+    # Saliency crop search on the cover-sized frame for every rendition aspect
+    # ratio, next to the cover resize it follows.
+    processor = PropertyImageProcessor(crop_mode='saliency')
+    targets = {'listing': processor.target_size}
+    targets.update({name: config['size'] for name, config in processor.rendition_configs.items()
+                    if config.get('fit', 'cover') == 'cover'})
+
+    photos = [make_synthetic_photo(size[0], size[1], seed=seed) for seed in range(count)]
+    results = {'images': count}
+    for name, target in targets.items():
+        covers = [processor._cover_resize(photo, target) for photo in photos]
+        processor._crop_box(covers[0], target)
+        search = _time_calls(lambda cover: processor._crop_box(cover, target), covers)
+        resize = _time_calls(lambda photo: processor._cover_resize(photo, target), photos[:3])
+        results[name] = {
+            'target_size': target,
+            'crop_search_ms': _summarize(search),
+            'cover_resize_ms': round(statistics.mean(resize) * 1000, 1)
+        }
+    return results
+
+
+def benchmark_caption_batching(count: int = 16, size: Tuple[int, int] = (1080, 810),
+                               batch_sizes: Tuple[int, ...] = (1, 2, 4, 8)) -> dict:
+    # BLIP captioning throughput against generate() batch size. Needs torch,
+    # transformers and the model weights, so it is imported here.
+    from property_descriptions import PropertyDescriptionGenerator
+
+    work_dir = tempfile.mkdtemp(prefix='realtygenie_bench_')
+    try:
+        paths = write_synthetic_images(os.path.join(work_dir, 'input'), count, size)
+        generator = PropertyDescriptionGenerator()
+        generator.generate_descriptions_batch(paths[:1], batch_size=1)
+
+        results = {'images': count, 'device': generator.device, 'preprocess_workers': generator.preprocess_workers}
+        baseline = None
+        for batch_size in batch_sizes:
+            start = time.perf_counter()
+            generator.generate_descriptions_batch(paths, batch_size=batch_size)
+            elapsed = time.perf_counter() - start
+
+            baseline = baseline or elapsed
+            results[f"batch_{batch_size}"] = {
+                'seconds': round(elapsed, 2),
+                'images_per_sec': round(count / elapsed, 2),
+                'speedup': round(baseline / elapsed, 2)
+            }
+        return results
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def benchmark_model_registry() -> dict:
+    # Cold BLIP load vs. constructing another generator once the registry
+    # holds the weights (what every Streamlit click used to pay).
+    from model_registry import registry
+    from property_descriptions import PropertyDescriptionGenerator
+
+    registry.unload()
+    start = time.perf_counter()
+    generator = PropertyDescriptionGenerator()
+    cold = time.perf_counter() - start
+    start = time.perf_counter()
+    PropertyDescriptionGenerator()
+    warm = time.perf_counter() - start
+    start = time.perf_counter()
+    generator.warm_up()
+    inference_warm_up = time.perf_counter() - start
+
+    return {
+        'cold_construct_s': round(cold, 2),
+        'cached_construct_ms': round(warm * 1000, 2),
+        'inference_warm_up_s': round(inference_warm_up, 2),
+        'model': generator.model_stats()
+    }
+
+
+def _run_caption_case(paths: List[str], quantize: bool, quantized_dir: str, backend: str = 'torch') -> dict:
+    # Runs in a fresh process so load time and peak RSS are for this model alone.
+    from property_descriptions import PropertyDescriptionGenerator
+
+    _reset_peak_rss()
+    start = time.perf_counter()
+    generator = PropertyDescriptionGenerator(quantize=quantize, quantized_dir=quantized_dir, backend=backend)
+    load_seconds = time.perf_counter() - start
+    # Deterministic beams, so the captions can be compared word for word.
+    generator.decoding_preset = 'balanced'
+    generator.warm_up()
+
+    timings, captions = [], {}
+    for path in paths:
+        start = time.perf_counter()
+        captions[path] = generator.generate_description(path).get('raw', '')
+        timings.append(time.perf_counter() - start)
+    return {'load_seconds': round(load_seconds, 2), 'latency': _summarize(timings),
+            'peak_rss_mb': _peak_rss_mb(), 'captions': captions}
+
+
+def _caption_overlap(reference: Dict[str, str], candidate: Dict[str, str]) -> dict:
+    scores = []
+    for path, caption in reference.items():
+        expected, actual = set(caption.lower().split()), set(candidate.get(path, '').lower().split())
+        scores.append(len(expected & actual) / len(expected | actual) if expected | actual else 1.0)
+    return {
+        'mean_word_jaccard': round(statistics.mean(scores), 3) if scores else None,
+        'exact_matches': sum(reference[path] == candidate.get(path) for path in reference)
+    }
+
+
+def benchmark_quantized_captions(count: int = 8, size: Tuple[int, int] = (1080, 810),
+                                 image_dir: Optional[str] = None) -> dict:
+    # float32 vs dynamic int8 BLIP on CPU: latency, peak RSS and caption
+    # overlap on a fixed image set (seeded synthetic photos unless image_dir
+    # is given). int8 runs twice: the first start quantizes and saves the
+    # weights, the second loads them.
+    from concurrent.futures import ProcessPoolExecutor
+    from multiprocessing import get_context
+
+    work_dir = tempfile.mkdtemp(prefix='realtygenie_bench_')
+    try:
+        if image_dir:
+            paths = sorted(os.path.join(image_dir, name) for name in os.listdir(image_dir)
+                           if name.lower().endswith(('.jpg', '.jpeg', '.png', '.webp')))[:count]
+        else:
+            paths = write_synthetic_images(os.path.join(work_dir, 'input'), count, size)
+        quantized_dir = os.path.join(work_dir, 'models')
+
+        cases = {}
+        for name, quantize in (('float32', False), ('int8_first_start', True), ('int8_cached', True)):
+            with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as executor:
+                cases[name] = executor.submit(_run_caption_case, paths, quantize, quantized_dir).result()
+
+        reference = cases['float32']['captions']
+        results = {'images': len(paths)}
+        for name, case in cases.items():
+            results[name] = {key: value for key, value in case.items() if key != 'captions'}
+            if name != 'float32':
+                results[name]['caption_overlap'] = _caption_overlap(reference, case['captions'])
+        results['latency_speedup'] = round(cases['float32']['latency']['mean_ms'] /
+                                           cases['int8_cached']['latency']['mean_ms'], 2)
+        return results
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def benchmark_decoding_presets(count: int = 8, size: Tuple[int, int] = (1080, 810),
+                               image_dir: Optional[str] = None) -> dict:
+    # Per-image latency of each decoding preset and caption overlap with
+    # 'quality', then which preset a few latency budgets select from those timings.
+    from property_descriptions import DECODING_PRESETS, PropertyDescriptionGenerator
+
+    work_dir = tempfile.mkdtemp(prefix='realtygenie_bench_')
+    try:
+        if image_dir:
+            paths = sorted(os.path.join(image_dir, name) for name in os.listdir(image_dir)
+                           if name.lower().endswith(('.jpg', '.jpeg', '.png', '.webp')))[:count]
+        else:
+            paths = write_synthetic_images(os.path.join(work_dir, 'input'), count, size)
+        generator = PropertyDescriptionGenerator()
+        generator.warm_up()
+
+        captions, results = {}, {'images': len(paths)}
+        for name in DECODING_PRESETS:
+            timings, captions[name] = [], {}
+            for path in paths:
+                start = time.perf_counter()
+                captions[name][path] = generator.generate_description(path, preset=name).get('raw', '')
+                timings.append(time.perf_counter() - start)
+            results[name] = {'latency': _summarize(timings)}
+        for name in DECODING_PRESETS:
+            results[name]['caption_overlap'] = _caption_overlap(captions['quality'], captions[name])
+
+        fast, quality = generator.preset_latency_ms('fast'), generator.preset_latency_ms('quality')
+        results['budget_choices'] = {f"{budget:.0f}ms": generator.choose_preset(budget)
+                                     for budget in (fast * 0.5, (fast + quality) / 2, quality * 2)}
+        return results
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def benchmark_caption_cache(count: int = 24, size: Tuple[int, int] = (1080, 810), entries: int = 20000) -> dict:
+    # Cost of the SQLite caption cache itself, without the model: a cache hit
+    # is a content hash plus one indexed lookup, to set against the hundreds
+    # of milliseconds a BLIP caption takes. Also times stores and eviction
+    # with the table at its size limit.
+    work_dir = tempfile.mkdtemp(prefix='realtygenie_bench_')
+    try:
+        paths = write_synthetic_images(os.path.join(work_dir, 'input'), count, size)
+        cache = CaptionCache(os.path.join(work_dir, 'captions.db'), max_entries=entries)
+        with cache._lock, cache._connection:
+            now = time.time()
+            cache._connection.executemany(
+                "INSERT INTO captions VALUES (?, ?, ?, ?, ?, ?, ?)",
+                ((f"{index:064x}", 'model', 'prompt', 'balanced', 'a living room with a sofa', now, now)
+                 for index in range(entries - count)))
+        cache = CaptionCache(os.path.join(work_dir, 'captions.db'), max_entries=entries)
+
+        timings = {'hash': [], 'miss': [], 'store': [], 'hit': []}
+        keys = []
+        for path in paths:
+            start = time.perf_counter()
+            key = cache.make_key(path, 'model', 'prompt', 'balanced')
+            timings['hash'].append(time.perf_counter() - start)
+            keys.append(key)
+        for key in keys:
+            start = time.perf_counter()
+            cache.fetch(key)
+            timings['miss'].append(time.perf_counter() - start)
+            start = time.perf_counter()
+            cache.store(key, 'a modern kitchen with an island')
+            timings['store'].append(time.perf_counter() - start)
+        for path in paths:
+            start = time.perf_counter()
+            cache.fetch(cache.make_key(path, 'model', 'prompt', 'balanced'))
+            timings['hit'].append(time.perf_counter() - start)
+
+        # Past the limit every store also evicts the oldest rows.
+        start = time.perf_counter()
+        for index in range(count):
+            cache.store((f"overflow{index}", 'model', 'prompt', 'balanced'), 'a bedroom')
+        evicting_store_ms = (time.perf_counter() - start) * 1000 / count
+
+        results = {name: _summarize(values) for name, values in timings.items()}
+        results['evicting_store_ms'] = round(evicting_store_ms, 2)
+        results['cache'] = cache.get_stats()
+        return results
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def benchmark_caption_reprocessing(count: int = 8, size: Tuple[int, int] = (1080, 810)) -> dict:
+    # End to end: the same images captioned twice with a fresh cache. The
+    # second pass should skip generate() entirely.
+    from property_descriptions import PropertyDescriptionGenerator
+
+    work_dir = tempfile.mkdtemp(prefix='realtygenie_bench_')
+    try:
+        paths = write_synthetic_images(os.path.join(work_dir, 'input'), count, size)
+        generator = PropertyDescriptionGenerator(caption_cache=CaptionCache(os.path.join(work_dir, 'captions.db')))
+        generator.warm_up()
+
+        results = {}
+        for name in ('first_run', 'reprocess'):
+            start = time.perf_counter()
+            descriptions = generator.generate_descriptions_batch(paths)
+            elapsed = time.perf_counter() - start
+            results[name] = {'seconds': round(elapsed, 3),
+                             'cache_hits': sum(entry.get('caption_cache') == 'hit' for entry in descriptions.values())}
+        results['speedup'] = round(results['first_run']['seconds'] / results['reprocess']['seconds'], 1)
+        results['cache'] = generator.caption_cache.get_stats()
+        return results
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def benchmark_onnx_captions(count: int = 8, size: Tuple[int, int] = (1080, 810),
+                            image_dir: Optional[str] = None) -> dict:
+    # PyTorch vs ONNX Runtime BLIP on CPU with the same beam settings. The
+    # first ONNX start includes the one-off export; the second loads the
+    # cached graphs without touching the PyTorch weights.
+    from concurrent.futures import ProcessPoolExecutor
+    from multiprocessing import get_context
+
+    work_dir = tempfile.mkdtemp(prefix='realtygenie_bench_')
+    try:
+        if image_dir:
+            paths = sorted(os.path.join(image_dir, name) for name in os.listdir(image_dir)
+                           if name.lower().endswith(('.jpg', '.jpeg', '.png', '.webp')))[:count]
+        else:
+            paths = write_synthetic_images(os.path.join(work_dir, 'input'), count, size)
+        export_root = os.path.join(work_dir, 'models')
+
+        cases = {}
+        for name, backend in (('torch', 'torch'), ('onnx_first_start', 'onnx'), ('onnx_cached', 'onnx')):
+            with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as executor:
+                cases[name] = executor.submit(_run_caption_case, paths, False, export_root, backend).result()
+
+        reference = cases['torch']['captions']
+        results = {'images': len(paths)}
+        for name, case in cases.items():
+            results[name] = {key: value for key, value in case.items() if key != 'captions'}
+            if name != 'torch':
+                results[name]['caption_overlap'] = _caption_overlap(reference, case['captions'])
+        results['latency_speedup'] = round(cases['torch']['latency']['mean_ms'] /
+                                           cases['onnx_cached']['latency']['mean_ms'], 2)
+        return results
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def benchmark_onnx_parity(batch: int = 3, max_new_tokens: int = 12, beams: int = 3) -> dict:
+    # Offline check of the exporter and the NumPy decoders: a tiny randomly
+    # initialised BLIP is exported and decoded with ONNX Runtime, and the
+    # tokens are compared against transformers' generate() on the same inputs.
+    import torch
+    from onnx_captioning import OnnxBlipCaptioner, export_blip_onnx, tiny_blip_model
+
+    work_dir = tempfile.mkdtemp(prefix='realtygenie_bench_')
+    try:
+        model = tiny_blip_model()
+        export_dir = os.path.join(work_dir, 'tiny')
+        start = time.perf_counter()
+        export_blip_onnx(model, export_dir)
+        export_seconds = time.perf_counter() - start
+        captioner = OnnxBlipCaptioner(export_dir)
+
+        image_size = model.config.vision_config.image_size
+        generator = torch.Generator().manual_seed(0)
+        pixel_values = torch.randn(batch, 3, image_size, image_size, generator=generator)
+        input_ids = torch.randint(3, model.config.text_config.vocab_size, (batch, 4), generator=generator)
+
+        results = {'export_seconds': round(export_seconds, 2)}
+        for name, num_beams in (('greedy', 1), ('beam', beams)):
+            with torch.no_grad():
+                start = time.perf_counter()
+                expected = model.generate(pixel_values=pixel_values, input_ids=input_ids.clone(),
+                                          max_new_tokens=max_new_tokens, num_beams=num_beams,
+                                          do_sample=False, early_stopping=True).numpy()
+                torch_ms = (time.perf_counter() - start) * 1000
+            start = time.perf_counter()
+            actual = captioner.generate(pixel_values.numpy(), input_ids.numpy(), max_new_tokens=max_new_tokens,
+                                        num_beams=num_beams)
+            onnx_ms = (time.perf_counter() - start) * 1000
+
+            # Both sides pad finished rows with the tiny model's pad id, 0.
+            matches = sum(np.array_equal(np.trim_zeros(expected_row, 'b'), np.trim_zeros(actual_row, 'b'))
+                          for expected_row, actual_row in zip(expected, actual))
+            results[name] = {'sequences_matching': f"{matches}/{batch}",
+                             'torch_ms': round(torch_ms, 2), 'onnx_ms': round(onnx_ms, 2)}
+        return results
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+SUITE_MEGAPIXELS = (1, 12, 24, 50)
+SUITE_FORMATS = ('JPEG', 'PNG', 'WEBP')
+SUITE_LEVELS = ('light', 'medium', 'strong', 'auto')
+SUITE_QUALITIES = (75, 85, 95)
+QUICK_SUITE = {'megapixels': (1, 12), 'formats': ('JPEG',), 'qualities': (85,), 'repeats': 1}
+
+
+def _dimensions_for_megapixels(megapixels: float) -> Tuple[int, int]:
+    width = int(round((megapixels * 1_000_000 * 4 / 3) ** 0.5))
+    return width, int(round(width * 3 / 4))
+
+
+def _percentile(values: List[float], percentile: float) -> float:
+    return float(np.percentile(np.asarray(values), percentile))
+
+
+def _reset_peak_rss() -> None:
+    # A spawned worker inherits the parent's ru_maxrss across fork/exec, so
+    # on Linux the high-water mark is reset here and read back from /proc.
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+def _peak_rss_mb() -> Optional[float]:
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes.
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def _run_suite_case(input_path: str, levels: Tuple[str, ...], qualities: Tuple[int, ...], repeats: int,
+                    stage_order: str) -> dict:
+    # Runs in a fresh process so the peak RSS is for this input alone.
+    _reset_peak_rss()
+    processor = PropertyImageProcessor(stage_order=stage_order)
+    rows = []
+
+    for level in levels:
+        stage_timings = {'decode': [], 'denoise': [], 'enhance': [], 'resize': [], 'sharpen': []}
+        encode_timings = {quality: [] for quality in qualities}
+        denoised = []
+
+        for _ in range(repeats):
+            start = time.perf_counter()
+            with Image.open(input_path) as source:
+                if stage_order == 'resize_first':
+                    processor._draft_for_target(source, processor.target_size)
+                image = source.convert('RGB')
+            stage_timings['decode'].append(time.perf_counter() - start)
+
+            # 'denoise' is the noise estimate plus, above the threshold, the filter.
+            def denoise(img):
+                gated = processor._estimate_noise(img) > processor.denoise_settings['threshold']
+                denoised.append(gated)
+                return processor._reduce_noise(img) if gated else img
+
+            steps = [('resize', lambda img: processor._smart_resize(img, processor.target_size)),
+                     ('denoise', denoise),
+                     ('enhance', lambda img: processor._apply_enhancements(img, level, denoise=False))]
+            if stage_order != 'resize_first':
+                steps = steps[1:] + steps[:1]
+            steps.append(('sharpen', processor._optimize_for_web))
+
+            for stage, step in steps:
+                start = time.perf_counter()
+                image = step(image)
+                stage_timings[stage].append(time.perf_counter() - start)
+
+            for quality in qualities:
+                start = time.perf_counter()
+                processor._encode(image, 'jpeg', quality)
+                encode_timings[quality].append(time.perf_counter() - start)
+
+        for quality in qualities:
+            per_stage = dict(stage_timings, encode=encode_timings[quality])
+            totals = [sum(stage[index] for stage in per_stage.values()) for index in range(repeats)]
+            rows.append({
+                'enhancement_level': level,
+                'quality': quality,
+                'denoised': any(denoised),
+                'stages_ms': {
+                    stage: {'p50': round(_percentile(values, 50) * 1000, 1),
+                            'p95': round(_percentile(values, 95) * 1000, 1)}
+                    for stage, values in per_stage.items()
+                },
+                'latency_ms': {'p50': round(_percentile(totals, 50) * 1000, 1),
+                               'p95': round(_percentile(totals, 95) * 1000, 1)},
+                'images_per_sec': round(len(totals) / sum(totals), 2)
+            })
+
+    return {'rows': rows, 'peak_rss_mb': _peak_rss_mb()}
+
+
+def run_stage_suite(megapixels: Tuple[float, ...] = SUITE_MEGAPIXELS, formats: Tuple[str, ...] = SUITE_FORMATS,
+                    levels: Tuple[str, ...] = SUITE_LEVELS, qualities: Tuple[int, ...] = SUITE_QUALITIES,
+                    repeats: int = 3, stage_order: str = 'enhance_first') -> dict:
+    import platform
+    import PIL
+    from concurrent.futures import ProcessPoolExecutor
+    from multiprocessing import get_context
+
+    report = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'pillow': PIL.__version__,
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'stage_order': stage_order,
+            'repeats': repeats
+        },
+        'results': []
+    }
+
+    work_dir = tempfile.mkdtemp(prefix='realtygenie_suite_')
+    try:
+        for fmt in formats:
+            for mp in megapixels:
+                size = _dimensions_for_megapixels(mp)
+                input_path = write_synthetic_images(os.path.join(work_dir, fmt.lower()), 1, size, fmt)[0]
+                print(f"   {fmt} {mp} MP ({size[0]}x{size[1]})")
+
+                with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as executor:
+                    case = executor.submit(_run_suite_case, input_path, levels, qualities, repeats,
+                                           stage_order).result()
+
+                for row in case['rows']:
+                    report['results'].append(dict(
+                        {'format': fmt, 'megapixels': mp, 'dimensions': list(size),
+                         'input_file_size': os.path.getsize(input_path), 'peak_rss_mb': case['peak_rss_mb']},
+                        **row
+                    ))
+                os.remove(input_path)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return report
+
+
+def benchmark_instrumentation_overhead(count: int = 20, size: Tuple[int, int] = (1600, 1200)) -> dict:
+    from instrumentation import StageAggregator, JsonLinesSink
+
+    work_dir = tempfile.mkdtemp(prefix='realtygenie_bench_')
+    try:
+        paths = write_synthetic_images(os.path.join(work_dir, 'input'), count, size)
+        output_path = os.path.join(work_dir, 'output.jpg')
+        variants = {
+            'no_sinks': [],
+            'aggregator': [StageAggregator()],
+            'aggregator_and_jsonl': [StageAggregator(), JsonLinesSink(os.path.join(work_dir, 'events.jsonl'))]
+        }
+
+        results = {}
+        for name, callbacks in variants.items():
+            processor = PropertyImageProcessor(stage_order='resize_first', stage_callbacks=callbacks)
+            results[name] = _summarize(_time_calls(lambda path: processor.process_image(path, output_path), paths))
+
+        # Cost of the recorder itself, isolated from image work.
+        from instrumentation import StageRecorder
+        recorder_calls = 100_000
+        recorder = StageRecorder('bench.jpg')
+        start = time.perf_counter()
+        for _ in range(recorder_calls):
+            recorder.run('noop', int)
+        results['recorder_overhead_us_per_stage'] = round((time.perf_counter() - start) / recorder_calls * 1e6, 2)
+        return results
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def _run_memory_case(input_path: str, settings: dict) -> dict:
+    # Runs in a fresh process; the peak before processing is the import
+    # baseline, so the delta is what process_image itself needed.
+    processor = PropertyImageProcessor(**settings)
+    _reset_peak_rss()
+    baseline = _peak_rss_mb()
+    start = time.perf_counter()
+    metadata = processor.process_image(input_path, os.path.splitext(input_path)[0] + '_out.jpg')
+    elapsed = time.perf_counter() - start
+    peak = _peak_rss_mb()
+    return {
+        'status': metadata['status'],
+        'memory_strategy': metadata.get('memory_strategy'),
+        'working_dimensions': metadata.get('working_dimensions'),
+        'estimated_peak_mb': metadata.get('peak_memory_mb'),
+        'measured_peak_mb': round(peak - baseline, 1) if peak is not None else None,
+        'elapsed_ms': round(elapsed * 1000, 1)
+    }
+
+
+def benchmark_memory_budget(size: Tuple[int, int] = (12000, 8000), budgets_mb: Tuple[float, ...] = (1024, 512)) -> dict:
+    from concurrent.futures import ProcessPoolExecutor
+    from multiprocessing import get_context
+
+    cases = {'unbounded': {}}
+    for budget in budgets_mb:
+        cases[f"tile_{budget:g}mb"] = {'memory_budget_mb': budget, 'oversize_strategy': 'tile'}
+        cases[f"downscale_{budget:g}mb"] = {'memory_budget_mb': budget, 'oversize_strategy': 'downscale'}
+
+    work_dir = tempfile.mkdtemp(prefix='realtygenie_bench_')
+    try:
+        input_path = write_synthetic_images(work_dir, 1, size)[0]
+        results = {}
+        for name, settings in cases.items():
+            with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as executor:
+                results[name] = executor.submit(_run_memory_case, input_path, settings).result()
+        return results
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def _suite_row_key(row: dict) -> tuple:
+    return row['format'], row['megapixels'], row['enhancement_level'], row['quality']
+
+
+def print_suite_table(report: dict) -> None:
+    print(f"{'format':<6}{'MP':>5}{'level':>8}{'q':>4}{'p50_ms':>10}{'p95_ms':>10}{'img/s':>8}{'rss_mb':>9}")
+    for row in report['results']:
+        print(f"{row['format']:<6}{row['megapixels']:>5}{row['enhancement_level']:>8}{row['quality']:>4}"
+              f"{row['latency_ms']['p50']:>10}{row['latency_ms']['p95']:>10}{row['images_per_sec']:>8}"
+              f"{row['peak_rss_mb'] or '-':>9}")
+
+
+def compare_suite_reports(baseline: dict, current: dict) -> List[dict]:
+    baseline_rows = {_suite_row_key(row): row for row in baseline['results']}
+    changes = []
+    for row in current['results']:
+        previous = baseline_rows.get(_suite_row_key(row))
+        if previous is None:
+            continue
+        before, after = previous['latency_ms']['p50'], row['latency_ms']['p50']
+        change = (after - before) / before * 100 if before else 0.0
+        changes.append({'case': list(_suite_row_key(row)), 'baseline_p50_ms': before,
+                        'current_p50_ms': after, 'change': f"{change:+.1f}%"})
+        print(f"{' '.join(str(part) for part in _suite_row_key(row)):<28}{before:>10}{after:>10}{change:>+9.1f}%")
+    return changes
+
+
+BENCHMARKS = {
+    'pipeline_modes': benchmark_pipeline_modes,
+    'enhancement_engines': benchmark_enhancement_engines,
+    'stage_orders': benchmark_stage_orders,
+    'batch_workers': benchmark_batch_workers,
+    'quality_search': benchmark_quality_search,
+    'output_encoders': benchmark_output_encoders,
+    'header_reads': benchmark_header_reads,
+    'instrumentation_overhead': benchmark_instrumentation_overhead,
+    'auto_enhancement': benchmark_auto_enhancement,
+    'duplicate_detection': benchmark_duplicate_detection,
+    'frame_memo': benchmark_frame_memo,
+    'smart_crop': benchmark_smart_crop,
+    'caption_batching': benchmark_caption_batching,
+    'model_registry': benchmark_model_registry,
+    'quantized_captions': benchmark_quantized_captions,
+    'decoding_presets': benchmark_decoding_presets,
+    'caption_cache': benchmark_caption_cache,
+    'caption_reprocessing': benchmark_caption_reprocessing,
+    'onnx_captions': benchmark_onnx_captions,
+    'onnx_parity': benchmark_onnx_parity,
+    'memory_budget': benchmark_memory_budget,
+    'suite': run_stage_suite,
+}
+
+
+# These need torch and transformers (and, apart from onnx_parity, the
+# downloaded BLIP weights), so they only run when named explicitly.
+MODEL_BENCHMARKS = ('caption_batching', 'model_registry', 'quantized_captions', 'decoding_presets',
+                    'caption_reprocessing', 'onnx_captions', 'onnx_parity')
+
+def main():
+    parser = argparse.ArgumentParser(description="RealtyGenie image pipeline benchmarks")
+    parser.add_argument('benchmarks', nargs='*',
+                        help=f"benchmarks to run: {', '.join(BENCHMARKS)} "
+                             f"(default: everything except suite and {', '.join(MODEL_BENCHMARKS)})")
+    parser.add_argument('--output', help="write the results as JSON to this file")
+    parser.add_argument('--quick', action='store_true', help="run the suite on a reduced grid")
+    parser.add_argument('--compare', help="earlier --output file to compare the suite results against")
+    args = parser.parse_args()
+
+    unknown = [name for name in args.benchmarks if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmark(s): {', '.join(unknown)}")
+
+    selected = args.benchmarks or [name for name in BENCHMARKS if name != 'suite' and name not in MODEL_BENCHMARKS]
+    report = {}
+
+    for name in selected:
+        print(f"⏱️ Running benchmark: {name}")
+        kwargs = QUICK_SUITE if name == 'suite' and args.quick else {}
+        report[name] = BENCHMARKS[name](**kwargs)
+        if name == 'suite':
+            print_suite_table(report[name])
+        else:
+            print(json.dumps(report[name], indent=2))
+
+    if args.compare and 'suite' in report:
+        with open(args.compare) as f:
+            compare_suite_reports(json.load(f)['suite'], report['suite'])
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Results saved to {args.output}")
+
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,322 @@
+import os
+import sys
+import shutil
+import io
+import argparse
+import tempfile
+import traceback
+
+import numpy as np
+from PIL import Image
+
+from benchmarks import (compare_enhancement_engines, make_synthetic_photo, measure_enhancement_memory,
+                        write_synthetic_images)
+from image_cache import CaptionCache, ProcessedImageCache
+from image_processor import BatchSummary, PropertyImageProcessor, open_image
+
+
+class _CrashingProcessor(PropertyImageProcessor):
+    # Kills its worker outright on images named crash_*, the way the OOM
+    # killer would; module level so pool workers can unpickle it.
+
+    def _process_image_uncached(self, image_path: str, *args, **kwargs) -> dict:
+        if os.path.basename(image_path).startswith('crash_'):
+            os._exit(1)
+        return super()._process_image_uncached(image_path, *args, **kwargs)
+
+
+def check_worker_crash(count: int = 8, workers: int = 2) -> dict:
+    # One worker dying must fail only the image that killed it.
+    work_dir = tempfile.mkdtemp(prefix='realtygenie_check_')
+    try:
+        input_dir = os.path.join(work_dir, 'input')
+        paths = write_synthetic_images(input_dir, count, (640, 480))
+        crash_name = 'crash_' + os.path.basename(paths[2])
+        os.rename(paths[2], os.path.join(input_dir, crash_name))
+
+        batch = _CrashingProcessor().process_batch(input_dir, os.path.join(work_dir, 'output'), workers=workers)
+        results = batch['results']
+        failed = sorted(name for name, metadata in results.items() if metadata['status'] != 'success')
+        assert len(results) == count, f"expected {count} results, got {len(results)}"
+        assert failed == [crash_name], f"expected only {crash_name} to fail, got {failed}"
+        assert 'died' in results[crash_name]['error'], results[crash_name]['error']
+        assert batch['summary']['failed'] == 1, batch['summary']
+        return {'images': count, 'failed': failed}
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def check_running_summary(count: int = 6) -> dict:
+    # The summary iter_batch updates must be right after every image, not
+    # just at the end: unprocessed images are pending, not failed.
+    work_dir = tempfile.mkdtemp(prefix='realtygenie_check_')
+    try:
+        input_dir = os.path.join(work_dir, 'input')
+        write_synthetic_images(input_dir, count - 1, (640, 480))
+        with open(os.path.join(input_dir, 'aaa_corrupt.jpg'), 'wb') as f:
+            f.write(b'not a jpeg')
+
+        summary = BatchSummary()
+        seen = 0
+        for _, metadata in PropertyImageProcessor().iter_batch(input_dir, os.path.join(work_dir, 'output'),
+                                                               workers=1, summary=summary):
+            seen += 1
+            running = summary.to_dict()
+            assert running['processed'] == seen and running['pending'] == count - seen, running
+            assert running['failed'] == summary.failed == seen - running['successful'] - running['skipped'], running
+        assert summary.to_dict()['failed'] == 1, summary.to_dict()
+        return {'images': count, 'failed': summary.failed}
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def check_quality_memo(count: int = 3, workers: int = 2) -> dict:
+    # A remembered byte-budget quality must only be reused for the same frame,
+    # and qualities found in pool workers must reach the parent's memo.
+    work_dir = tempfile.mkdtemp(prefix='realtygenie_check_')
+    try:
+        input_dir = os.path.join(work_dir, 'input')
+        paths = write_synthetic_images(input_dir, count, (1600, 1200))
+        processor = PropertyImageProcessor(target_file_size=60 * 1024)
+        first = processor.process_image(paths[0], os.path.join(work_dir, 'first.jpg'))
+        repeat = processor.process_image(paths[0], os.path.join(work_dir, 'repeat.jpg'))
+        assert repeat['encode_quality'] == first['encode_quality'], (first, repeat)
+        assert repeat['quality_search_encodes'] <= 2, repeat
+
+        processor.target_size = (320, 240)
+        smaller = processor.process_image(paths[0], os.path.join(work_dir, 'smaller.jpg'))
+        assert smaller['encode_quality'] > first['encode_quality'], (first, smaller)
+
+        pooled = PropertyImageProcessor(target_file_size=60 * 1024)
+        pooled.process_batch(input_dir, os.path.join(work_dir, 'output'), workers=workers)
+        assert len(pooled._quality_memo) == count, len(pooled._quality_memo)
+        return {'first_encodes': first['quality_search_encodes'], 'repeat_encodes': repeat['quality_search_encodes']}
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def check_caption_keys() -> dict:
+    # Captions are cached on the frame before encoding: quality and format
+    # changes must keep the key, anything that changes the pixels must not.
+    work_dir = tempfile.mkdtemp(prefix='realtygenie_check_')
+    try:
+        path = write_synthetic_images(work_dir, 1, (1600, 1200))[0]
+        processor = PropertyImageProcessor()
+        digest = processor.frame_digest(path, 'medium')
+        processor.quality, processor.output_format = 60, 'webp'
+        assert processor.frame_digest(path, 'medium') == digest, "an encode setting changed the frame digest"
+        assert processor.frame_digest(path, 'strong') != digest, "the enhancement level kept the frame digest"
+        processor.crop_mode = 'center' if processor.crop_mode != 'center' else 'saliency'
+        assert processor.frame_digest(path, 'medium') != digest, "the crop mode kept the frame digest"
+
+        cache = CaptionCache(os.path.join(work_dir, 'captions.db'))
+        cache.store(cache.make_key(path, 'model', 'prompt', 'balanced', digest), 'a bright living room')
+        reencoded = os.path.join(work_dir, 'reencoded.jpg')
+        Image.open(path).save(reencoded, quality=50)
+        assert cache.fetch(cache.make_key(reencoded, 'model', 'prompt', 'balanced', digest)) == 'a bright living room'
+        return {'digest': digest[:12]}
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def check_near_duplicates(shots: int = 3, size: tuple = (2000, 1500), workers: int = 2) -> dict:
+    # Re-exports and burst frames group with their shot; a mirrored frame of
+    # the same room is a different photo. Pooled hashing must match serial.
+    work_dir = tempfile.mkdtemp(prefix='realtygenie_check_')
+    try:
+        expected = {}
+        for shot in range(shots):
+            photo = make_synthetic_photo(size[0], size[1], seed=shot)
+            photo.save(os.path.join(work_dir, f"shot{shot}_a.jpg"), quality=92)
+            photo.save(os.path.join(work_dir, f"shot{shot}_b_reexport.png"))
+            photo.crop((20, 15, size[0], size[1])).save(os.path.join(work_dir, f"shot{shot}_c_burst.jpg"), quality=92)
+            photo.transpose(Image.Transpose.FLIP_LEFT_RIGHT).save(os.path.join(work_dir, f"shot{shot}_d_mirror.jpg"))
+            expected[f"shot{shot}_b_reexport.png"] = expected[f"shot{shot}_c_burst.jpg"] = f"shot{shot}_a.jpg"
+        sources = {name: os.path.join(work_dir, name) for name in sorted(os.listdir(work_dir))}
+
+        processor = PropertyImageProcessor()
+        serial = processor.find_near_duplicates(sources)
+        pooled = processor.find_near_duplicates(sources, workers=workers)
+        assert pooled == serial, (serial, pooled)
+        found = {name: representative for name, (representative, _) in serial.items()}
+        assert found == expected, found
+        return {'images': len(sources), 'near_duplicates': len(found)}
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def check_cache_stats(count: int = 6, workers: int = 2) -> dict:
+    # Cache stats come from running totals; stores made in pool workers must
+    # be counted, and the totals must match the directory, evictions included.
+    work_dir = tempfile.mkdtemp(prefix='realtygenie_check_')
+    try:
+        input_dir = os.path.join(work_dir, 'input')
+        write_synthetic_images(input_dir, count, (640, 480))
+        cache = ProcessedImageCache(os.path.join(work_dir, 'cache'))
+        stats = PropertyImageProcessor(cache=cache).process_batch(input_dir, os.path.join(work_dir, 'output'),
+                                                                  workers=workers)['summary']['cache']
+        assert stats['stores'] == stats['entries'] == count and stats['evictions'] == 0, stats
+        assert stats == dict(ProcessedImageCache(cache.cache_dir).get_stats(), **_counters(stats)), stats
+
+        # Room for about half the entries: the pooled stores must evict.
+        cache.max_size_bytes = cache.total_size // 2
+        cache.clear()
+        stats = PropertyImageProcessor(cache=cache).process_batch(input_dir, os.path.join(work_dir, 'output'),
+                                                                  workers=workers)['summary']['cache']
+        assert stats['evictions'] > 0 and stats['stores'] == count * 2, stats
+        reseeded = ProcessedImageCache(cache.cache_dir, cache.max_size_bytes / (1024 * 1024)).get_stats()
+        assert (stats['entries'], stats['size_mb']) == (reseeded['entries'], reseeded['size_mb']), (stats, reseeded)
+
+        # The caption cache's running row count: replacements don't add rows
+        # and eviction stops at max_entries.
+        captions = CaptionCache(os.path.join(work_dir, 'captions.db'), max_entries=count)
+        for index in range(count + 3):
+            captions.store((f"image{index}", 'model', 'prompt', 'balanced'), 'a kitchen')
+        captions.store((f"image{count + 2}", 'model', 'prompt', 'balanced'), 'a bright kitchen')
+        running = captions.entry_count
+        caption_stats = captions.get_stats()
+        assert running == caption_stats['entries'] == count and caption_stats['evictions'] == 3, (running, caption_stats)
+        return {'entries': stats['entries'], 'evictions': stats['evictions'], 'caption_evictions': caption_stats['evictions']}
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def _counters(stats: dict) -> dict:
+    return {name: stats[name] for name in ('hits', 'misses', 'hit_rate', 'stores', 'evictions')}
+
+
+def check_pixel_limit(size: tuple = (8000, 6000)) -> dict:
+    # Oversized inputs are rejected from the header, and opening them must
+    # leave Pillow's process-wide decompression-bomb limit untouched.
+    buffer = io.BytesIO()
+    Image.new('L', size).save(buffer, 'PNG', compress_level=1)
+    data, limit = buffer.getvalue(), Image.MAX_IMAGE_PIXELS
+
+    try:
+        open_image(io.BytesIO(data), max_pixels=size[0] * size[1] - 1)
+    except Exception as e:
+        assert 'pixel limit' in str(e), e
+    else:
+        raise AssertionError("an image above max_pixels was opened")
+    with open_image(io.BytesIO(data), max_pixels=None) as opened:
+        assert opened.size == size, opened.size
+    assert Image.MAX_IMAGE_PIXELS == limit, Image.MAX_IMAGE_PIXELS
+    return {'pixels': size[0] * size[1], 'pillow_limit': limit}
+
+
+def check_enhancement_engines(seeds: tuple = (0, 1, 2), sizes: tuple = ((4032, 3024), (1600, 1200)),
+                              max_mean_error: float = 2.3, max_abs_error: int = 12) -> dict:
+    # The fused engine must stay within a fixed pixel difference of the
+    # ImageEnhance chain for every profile, and peak no higher than it.
+    worst = {'mean_abs_error': 0.0, 'max_abs_error': 0}
+    for size in sizes:
+        for seed in seeds:
+            image = make_synthetic_photo(size[0], size[1], seed=seed)
+            for level in ('light', 'medium', 'strong', 'auto'):
+                error = compare_enhancement_engines(image, level)
+                assert error['mean_abs_error'] <= max_mean_error and error['max_abs_error'] <= max_abs_error, \
+                    (size, seed, level, error)
+                worst = {name: max(worst[name], error[name]) for name in worst}
+    
+    memory = measure_enhancement_memory(sizes[0])
+    if None not in memory.values():
+        assert memory['fused'] <= memory['chain'], f"fused engine peaked above the chain: {memory}"
+    worst['peak_memory_mb'] = memory
+    return worst
+
+
+def _caption_tokens(row: np.ndarray, sep: int) -> np.ndarray:
+    # Anything after the first [SEP] is padding; transformers 5 pads beam
+    # search output with [SEP] rather than the pad token.
+    ends = np.flatnonzero(row == sep)
+    return row[:ends[0] + 1] if ends.size else np.trim_zeros(row, 'b')
+
+
+def check_onnx_parity(model_seeds: tuple = (0, 1, 2), input_seeds: tuple = (0, 1), batch: int = 4,
+                      max_new_tokens: int = 12, sep_bias: float = 0.4) -> dict:
+    # The ONNX exporter and NumPy decoders must produce exactly the tokens of
+    # transformers' generate(). The tiny models get a [SEP] logit bias so that
+    # beams finish at different lengths and the length penalty decides.
+    import torch
+    from onnx_captioning import OnnxBlipCaptioner, export_blip_onnx, tiny_blip_model
+
+    work_dir = tempfile.mkdtemp(prefix='realtygenie_check_')
+    try:
+        compared, lengths = 0, set()
+        for model_seed in model_seeds:
+            model = tiny_blip_model(model_seed)
+            sep = model.config.text_config.sep_token_id
+            with torch.no_grad():
+                model.text_decoder.cls.predictions.decoder.bias[sep] += sep_bias
+            export_dir = os.path.join(work_dir, f"tiny{model_seed}")
+            export_blip_onnx(model, export_dir)
+            captioner = OnnxBlipCaptioner(export_dir)
+            image_size = model.config.vision_config.image_size
+
+            for input_seed in input_seeds:
+                generator = torch.Generator().manual_seed(input_seed)
+                pixel_values = torch.randn(batch, 3, image_size, image_size, generator=generator)
+                input_ids = torch.randint(3, model.config.text_config.vocab_size, (batch, 4), generator=generator)
+                for num_beams, length_penalty in ((1, 1.0), (2, 1.0), (3, 0.5), (3, 1.0), (3, 2.0), (5, 2.0)):
+                    with torch.no_grad():
+                        expected = model.generate(pixel_values=pixel_values, input_ids=input_ids.clone(),
+                                                  max_new_tokens=max_new_tokens, num_beams=num_beams,
+                                                  length_penalty=length_penalty, do_sample=False,
+                                                  early_stopping=num_beams > 1).numpy()
+                    actual = captioner.generate(pixel_values.numpy(), input_ids.numpy(), max_new_tokens=max_new_tokens,
+                                                num_beams=num_beams, length_penalty=length_penalty)
+                    for row, (expected_row, actual_row) in enumerate(zip(expected, actual)):
+                        expected_row, actual_row = _caption_tokens(expected_row, sep), _caption_tokens(actual_row, sep)
+                        assert np.array_equal(expected_row, actual_row), \
+                            (model_seed, input_seed, num_beams, length_penalty, row, expected_row, actual_row)
+                        lengths.add(len(expected_row))
+                        compared += 1
+        assert len(lengths) > 2, f"fixtures only produced lengths {sorted(lengths)}"
+        return {'sequences': compared, 'lengths': sorted(lengths)}
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+CHECKS = {
+    'worker_crash': check_worker_crash,
+    'running_summary': check_running_summary,
+    'quality_memo': check_quality_memo,
+    'caption_keys': check_caption_keys,
+    'near_duplicates': check_near_duplicates,
+    'cache_stats': check_cache_stats,
+    'pixel_limit': check_pixel_limit,
+    'enhancement_engines': check_enhancement_engines,
+    'onnx_parity': check_onnx_parity,
+}
+
+# Need torch, transformers and onnxruntime, so they only run when named.
+MODEL_CHECKS = ('onnx_parity',)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="RealtyGenie correctness checks; exits non-zero on any failure")
+    parser.add_argument('checks', nargs='*', help=f"checks to run: {', '.join(CHECKS)} "
+                                                  f"(default: all except {', '.join(MODEL_CHECKS)})")
+    args = parser.parse_args()
+
+    unknown = [name for name in args.checks if name not in CHECKS]
+    if unknown:
+        parser.error(f"unknown check(s): {', '.join(unknown)}")
+
+    selected = args.checks or [name for name in CHECKS if name not in MODEL_CHECKS]
+    failures = 0
+    for name in selected:
+        try:
+            details = CHECKS[name]()
+            print(f"✅ {name}: {details}")
+        except Exception:
+            failures += 1
+            print(f"❌ {name}")
+            traceback.print_exc()
+
+    print(f"{len(selected) - failures} passed, {failures} failed")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,306 @@
+import os
+import json
+import time
+import shutil
+import sqlite3
+import hashlib
+import tempfile
+import threading
+from typing import Optional, Tuple
+
+
+def hash_file(path: str, digest=None) -> str:
+    digest = digest or hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ProcessedImageCache:
+
+    def __init__(self, cache_dir: str = '.image_cache', max_size_mb: float = 512, use_links: bool = False):
+        self.cache_dir = cache_dir
+        self.max_size_bytes = int(max_size_mb * 1024 * 1024)
+        # Hard links make a hit nearly free, but the output then shares its
+        # inode with the cache entry, so editing it in place would corrupt it.
+        self.use_links = use_links
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        # Running totals, seeded by one walk here. Stores and evictions keep
+        # them current, so the directory is only walked again when the cache
+        # is over max_size_bytes. Other processes sharing the directory are
+        # only seen at that point.
+        entries = self._list_entries()
+        self.entry_count = len(entries)
+        self.total_size = sum(size for _, size, _ in entries)
+
+    def make_key(self, image_path: str, settings: dict) -> str:
+        digest = hashlib.sha256(json.dumps(settings, sort_keys=True).encode('utf-8'))
+        return hash_file(image_path, digest)
+
+    def fetch(self, key: str, output_path: str) -> Optional[dict]:
+        image_path, metadata_path = self._entry_paths(key)
+        try:
+            with open(metadata_path, 'r', encoding='utf-8') as f:
+                metadata = json.load(f)
+            self._materialize(image_path, output_path)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+
+        # mtime doubles as the LRU timestamp, so recency survives restarts
+        # and is shared by every process using the same directory.
+        for path in (image_path, metadata_path):
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+
+        self.hits += 1
+        metadata['output_path'] = output_path
+        return metadata
+
+    def store(self, key: str, output_path: str, metadata: dict) -> dict:
+        # Returns the change to the counters and totals, for merge() in
+        # another process (pool workers store into the parent's cache).
+        image_path, metadata_path = self._entry_paths(key)
+        os.makedirs(os.path.dirname(image_path), exist_ok=True)
+        replaced_size = self._entry_size(image_path)
+
+        self._atomic_copy(output_path, image_path)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(metadata_path), suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(metadata, f)
+        os.replace(temp_path, metadata_path)
+
+        change = {'stores': 1, 'evictions': 0, 'entries': 0 if replaced_size is not None else 1,
+                  'size': self._entry_size(image_path) - (replaced_size or 0)}
+        self.stores += 1
+        self.entry_count += change['entries']
+        self.total_size += change['size']
+        if self.total_size > self.max_size_bytes:
+            change['evictions'], removed_size = self._evict()
+            change['entries'] -= change['evictions']
+            change['size'] -= removed_size
+        return change
+
+    def merge(self, change: dict) -> None:
+        # Applies a store() result from another process, evicting here if
+        # that process's stale totals let the cache grow past the limit.
+        self.stores += change['stores']
+        self.evictions += change['evictions']
+        self.entry_count += change['entries']
+        self.total_size += change['size']
+        if self.total_size > self.max_size_bytes:
+            self.evict()
+
+    def evict(self) -> int:
+        return self._evict()[0]
+
+    def _evict(self) -> Tuple[int, int]:
+        entries = self._list_entries()
+        total_size = sum(size for _, size, _ in entries)
+
+        removed, removed_size = 0, 0
+        for mtime, size, image_path in sorted(entries):
+            if total_size <= self.max_size_bytes:
+                break
+            for path in (image_path, os.path.splitext(image_path)[0] + '.json'):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            total_size -= size
+            removed += 1
+            removed_size += size
+
+        self.evictions += removed
+        self.entry_count = len(entries) - removed
+        self.total_size = total_size
+        return removed, removed_size
+
+    def clear(self) -> None:
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.entry_count = 0
+        self.total_size = 0
+
+    def get_stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': f"{(self.hits / lookups * 100) if lookups else 0:.1f}%",
+            'stores': self.stores,
+            'evictions': self.evictions,
+            'entries': self.entry_count,
+            'size_mb': round(self.total_size / (1024 * 1024), 2),
+            'max_size_mb': round(self.max_size_bytes / (1024 * 1024), 2)
+        }
+
+    def _entry_paths(self, key: str):
+        base = os.path.join(self.cache_dir, key[:2], key)
+        return base + '.img', base + '.json'
+
+    def _entry_size(self, image_path: str) -> Optional[int]:
+        try:
+            size = os.path.getsize(image_path)
+        except FileNotFoundError:
+            return None
+        metadata_path = os.path.splitext(image_path)[0] + '.json'
+        return size + (os.path.getsize(metadata_path) if os.path.exists(metadata_path) else 0)
+
+    def _list_entries(self) -> list:
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith('.img'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                metadata_path = os.path.splitext(path)[0] + '.json'
+                metadata_size = os.path.getsize(metadata_path) if os.path.exists(metadata_path) else 0
+                entries.append((stat.st_mtime, stat.st_size + metadata_size, path))
+        return entries
+
+    def _materialize(self, cached_path: str, output_path: str) -> None:
+        output_dir = os.path.dirname(output_path)
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+
+        if self.use_links:
+            if os.path.exists(output_path):
+                os.remove(output_path)
+            try:
+                os.link(cached_path, output_path)
+                return
+            except OSError:
+                pass
+        shutil.copyfile(cached_path, output_path)
+
+    def _atomic_copy(self, source_path: str, destination_path: str) -> None:
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(destination_path), suffix='.tmp')
+        os.close(fd)
+        shutil.copyfile(source_path, temp_path)
+        os.replace(temp_path, destination_path)
+
+
+class CaptionCache:
+    # Raw BLIP captions in SQLite, keyed by (image content hash, model,
+    # prompt, decoding preset). Entries older than ttl_days are dropped and,
+    # past max_entries, the least recently used go first. WAL mode lets the
+    # app and batch scripts share one file.
+
+    def __init__(self, db_path: str = '.caption_cache.db', max_entries: int = 50000, ttl_days: float = 30):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_days * 86400
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # One connection shared by the Streamlit sessions' threads, so
+        # statements are serialized by a lock.
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("""
+                CREATE TABLE IF NOT EXISTS captions (
+                    image_hash TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    prompt TEXT NOT NULL,
+                    preset TEXT NOT NULL,
+                    raw_caption TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL,
+                    PRIMARY KEY (image_hash, model, prompt, preset)
+                )""")
+            self._connection.execute("CREATE INDEX IF NOT EXISTS captions_accessed ON captions (accessed_at)")
+            self._connection.execute("CREATE INDEX IF NOT EXISTS captions_created ON captions (created_at)")
+            # Counted once here and kept running, so store() never scans the
+            # table; rows written by other processes show up at get_stats().
+            self.entry_count = self._connection.execute("SELECT COUNT(*) FROM captions").fetchone()[0]
+
+    def make_key(self, image_path: str, model: str, prompt: str, preset: str,
+                 content_key: Optional[str] = None) -> Tuple[str, str, str, str]:
+        # content_key stands in for the file hash when the caller can name the
+        # pixels more stably than the encoded file (a re-encode changes the bytes).
+        return (content_key or hash_file(image_path), model, prompt, preset)
+
+    def fetch(self, key: Tuple[str, str, str, str]) -> Optional[str]:
+        now = time.time()
+        with self._lock, self._connection:
+            row = self._connection.execute(
+                "SELECT raw_caption FROM captions WHERE image_hash = ? AND model = ? AND prompt = ? AND preset = ?"
+                " AND created_at >= ?", (*key, now - self.ttl_seconds)).fetchone()
+            if row is not None:
+                self._connection.execute(
+                    "UPDATE captions SET accessed_at = ? WHERE image_hash = ? AND model = ? AND prompt = ?"
+                    " AND preset = ?", (now, *key))
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return row[0]
+
+    def store(self, key: Tuple[str, str, str, str], raw_caption: str) -> None:
+        now = time.time()
+        with self._lock, self._connection:
+            replaced = self._connection.execute(
+                "SELECT 1 FROM captions WHERE image_hash = ? AND model = ? AND prompt = ? AND preset = ?",
+                key).fetchone() is not None
+            self._connection.execute("INSERT OR REPLACE INTO captions VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                     (*key, raw_caption, now, now))
+            if not replaced:
+                self.entry_count += 1
+        self.stores += 1
+        self.evict()
+
+    def evict(self) -> int:
+        # Both deletes walk an index, so with nothing to remove this is two
+        # index probes.
+        with self._lock, self._connection:
+            removed = self._connection.execute("DELETE FROM captions WHERE created_at < ?",
+                                               (time.time() - self.ttl_seconds,)).rowcount
+            excess = self.entry_count - removed - self.max_entries
+            if excess > 0:
+                removed += self._connection.execute(
+                    "DELETE FROM captions WHERE rowid IN (SELECT rowid FROM captions ORDER BY accessed_at LIMIT ?)",
+                    (excess,)).rowcount
+            self.entry_count = max(0, self.entry_count - removed)
+        self.evictions += removed
+        return removed
+
+    def clear(self) -> None:
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM captions")
+            self.entry_count = 0
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            entries = self.entry_count = self._connection.execute("SELECT COUNT(*) FROM captions").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': f"{(self.hits / lookups * 100) if lookups else 0:.1f}%",
+            'stores': self.stores,
+            'evictions': self.evictions,
+            'entries': entries,
+            'max_entries': self.max_entries,
+            'size_mb': round(sum(os.path.getsize(path) for path in (self.db_path, self.db_path + '-wal')
+                                 if os.path.exists(path)) / (1024 * 1024), 2),
+            'ttl_days': round(self.ttl_seconds / 86400, 2)
+        }
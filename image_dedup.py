@@ -0,0 +1,45 @@
+from typing import Dict, Tuple
+
+import numpy as np
+from PIL import Image
+
+HASH_SIZE = 8
+
+# Set bits per byte value, for vectorized Hamming distances over uint64 hashes.
+_POPCOUNT = np.array([bin(value).count('1') for value in range(256)], dtype=np.uint8)
+
+
+def dhash(image: Image.Image) -> int:
+    # Difference hash: one bit per horizontally adjacent pair of a 9x8
+    # grayscale thumbnail, 64 bits in all. JPEGs decode only the luma plane at
+    # 1/8 DCT scale, so this costs a fraction of a full decode.
+    if image.format == 'JPEG':
+        image.draft('L', (HASH_SIZE * 8, HASH_SIZE * 8))
+    thumb = image.convert('L').resize((HASH_SIZE + 1, HASH_SIZE), Image.Resampling.BOX)
+    pixels = np.asarray(thumb, dtype=np.int16)
+    return int.from_bytes(np.packbits(pixels[:, 1:] > pixels[:, :-1]).tobytes(), 'big')
+
+
+def group_near_duplicates(hashes: Dict[str, int], threshold: int = 5) -> Dict[str, Tuple[str, int]]:
+    # Greedy grouping in insertion order: each image not yet claimed becomes
+    # a representative and claims every later image within threshold bits.
+    # Only comparing against representatives keeps a slow pan of burst shots
+    # from chaining into one group. Returns {duplicate: (representative, distance)}.
+    names = list(hashes)
+    if not names:
+        return {}
+    values = np.array([hashes[name] for name in names], dtype=np.uint64)
+    unclaimed = np.ones(len(names), dtype=bool)
+
+    duplicates = {}
+    for index, name in enumerate(names):
+        if not unclaimed[index]:
+            continue
+        unclaimed[index] = False
+        xor = (values[index + 1:] ^ values[index]).view(np.uint8).reshape(-1, 8)
+        distances = _POPCOUNT[xor].sum(axis=1, dtype=np.int64)
+        for offset in np.flatnonzero((distances <= threshold) & unclaimed[index + 1:]):
+            duplicate = index + 1 + offset
+            unclaimed[duplicate] = False
+            duplicates[names[duplicate]] = (name, int(distances[offset]))
+    return duplicates
@@ -1,34 +1,238 @@
 from PIL import Image, ImageEnhance, ImageFilter, ImageOps
 import os
 import json
+import hashlib
 import tempfile
 import shutil
-from typing import Tuple, Optional, Union
+import io
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, Future, ALL_COMPLETED, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Tuple, Optional, Union, List, Iterator, Dict
 import numpy as np
 
+from image_cache import ProcessedImageCache, hash_file
+from image_dedup import dhash, group_near_duplicates
+from smart_crop import best_window_offset, saliency_map
+from instrumentation import StageRecorder, StageCallback
+
+try:
+    import pillow_avif  # registers the AVIF codec on Pillow builds without native support
+except ImportError:
+    pillow_avif = None
+
+# Bump whenever a change alters the bytes process_image writes, so cached
+# outputs from older pipelines stop matching.
+PIPELINE_VERSION = 2
+
+EXIF_ORIENTATION_TAG = 0x0112
+
+# Pillow raises above twice Image.MAX_IMAGE_PIXELS; max_image_pixels defaults to that.
+DEFAULT_MAX_IMAGE_PIXELS = 178_956_970
+
+def open_image(image_source, max_pixels: Optional[int] = DEFAULT_MAX_IMAGE_PIXELS) -> Image.Image:
+    # Image.open only parses the header, so no pixels are decoded yet.
+    # Pillow's process-global limit still applies on top of max_pixels.
+    try:
+        image = Image.open(image_source)
+    except (Image.DecompressionBombError, Image.DecompressionBombWarning) as e:
+        # The warning (above Image.MAX_IMAGE_PIXELS) only raises when
+        # warnings are errors, e.g. under -W error.
+        raise Exception(f"Image rejected by Pillow's decompression-bomb check: {e}")
+    
+    width, height = image.size
+    if max_pixels is not None and width * height > max_pixels:
+        image.close()
+        raise Exception(f"Image is {width}x{height} ({width * height:,} pixels), "
+                        f"above the {max_pixels:,} pixel limit")
+    return image
+
+def read_image_header(image_source) -> dict:
+    # Image.open only parses the container headers; nothing here calls load(),
+    # so no pixel data is decoded. EXIF is only read when the header already
+    # carried it, because some plugins (PNG) would otherwise load the image.
+    start = image_source.tell() if hasattr(image_source, 'tell') else None
+    try:
+        with open_image(image_source, max_pixels=None) as image:
+            orientation = 1
+            if 'exif' in image.info or image.format in ('TIFF', 'MPO'):
+                orientation = image.getexif().get(EXIF_ORIENTATION_TAG, 1)
+            
+            width, height = image.size
+            return {
+                'dimensions': (width, height),
+                'display_dimensions': (height, width) if orientation in (5, 6, 7, 8) else (width, height),
+                'mode': image.mode,
+                'format': image.format,
+                'orientation': orientation
+            }
+    finally:
+        if start is not None:
+            image_source.seek(start)
+
+class BatchSummary:
+    
+    def __init__(self, enhancement_level: str = 'medium', total_images: int = 0):
+        self.enhancement_level = enhancement_level
+        self.total_images = total_images
+        self.processed = 0
+        self.successful = 0
+        self.skipped = 0
+        self.duplicates = 0
+        self.total_original_size = 0
+        self.total_final_size = 0
+    
+    def update(self, metadata: dict) -> None:
+        self.processed += 1
+        if metadata['status'] == 'success':
+            self.successful += 1
+            self.total_original_size += metadata['original_file_size']
+            self.total_final_size += metadata['final_file_size']
+        elif metadata['status'] == 'skipped':
+            self.skipped += 1
+        if 'duplicate_of' in metadata:
+            self.duplicates += 1
+    
+    @property
+    def failed(self) -> int:
+        return self.processed - self.successful - self.skipped
+    
+    def to_dict(self) -> dict:
+        overall_compression = 0
+        if self.total_original_size > 0:
+            overall_compression = (1 - self.total_final_size / self.total_original_size) * 100
+        
+        return {
+            'total_images': self.total_images,
+            'processed': self.processed,
+            'pending': self.total_images - self.processed,
+            'successful': self.successful,
+            'failed': self.failed,
+            'skipped': self.skipped,
+            'near_duplicates': self.duplicates,
+            'total_original_size_mb': round(self.total_original_size / (1024 * 1024), 2),
+            'total_final_size_mb': round(self.total_final_size / (1024 * 1024), 2),
+            'overall_compression_ratio': f"{overall_compression:.1f}%",
+            'enhancement_level': self.enhancement_level
+        }
+
 class PropertyImageProcessor:
     
-    def __init__(self, target_size: Tuple[int, int] = (1080, 810), quality: int = 85):
+    def __init__(self, target_size: Tuple[int, int] = (1080, 810), quality: int = 85, pipeline: str = 'single_pass',
+                 enhancement_engine: str = 'fused', stage_order: str = 'enhance_first',
+                 cache: Optional[ProcessedImageCache] = None, target_file_size: Optional[int] = None,
+                 min_quality: int = 40, output_format: str = 'jpeg',
+                 stage_callbacks: Optional[List[StageCallback]] = None, memory_budget_mb: Optional[float] = None,
+                 oversize_strategy: str = 'tile', max_image_pixels: Optional[int] = DEFAULT_MAX_IMAGE_PIXELS,
+                 frame_memo_mb: Optional[float] = None, crop_mode: str = 'center'):
         self.target_size = target_size
         self.quality = quality
+        # 'single_pass' decodes once and encodes once; 'multi_pass' keeps the
+        # original enhance -> resize -> compress chain with intermediate files.
+        self.pipeline = pipeline
+        # 'fused' folds brightness and contrast into one LUT and autocontrast
+        # (plus gamma) into another, using thumbnail statistics; 'chain' runs
+        # the ImageEnhance objects one by one.
+        self.enhancement_engine = enhancement_engine
+        self.stats_thumbnail_size = 256
+        # 'resize_first' lets JPEGs decode at a reduced DCT scale and runs the
+        # enhancement passes on the target-sized buffer instead of the original.
+        self.stage_order = stage_order
+        self.resize_reducing_gap = 2.0
+        # 'center' or 'saliency' (see smart_crop.py); renditions can override it.
+        self.crop_mode = crop_mode
+        self.saliency_size = 128
+        self.saliency_center_bias = 0.1
+        # Inputs above max_image_pixels are rejected before decoding. Over
+        # memory_budget_mb, frames are enhanced in strips ('tile') or decoded
+        # smaller ('downscale'); the chain engine can only downscale.
+        self.max_image_pixels = max_image_pixels
+        self.memory_budget_mb = memory_budget_mb
+        self.oversize_strategy = oversize_strategy
+        self.tile_min_rows = 64
+        self.tile_overlap = 8
+        # Peak bytes per working pixel, measured with benchmarks.py memory_budget.
+        # Pillow stores RGB as 4 bytes per pixel.
+        self.stage_bytes_per_pixel = {'buffer': 4, 'fused': 16, 'chain': 16}
+        # Max differing bits (of 64) for two dHashes to count as the same shot.
+        # Re-exports and recompressions land at 0-2 and burst frames within ~4,
+        # but a mirrored frame of the same room scored 7.
+        self.duplicate_threshold = 5
+        self.cache = cache
+        # Per-stage instrumentation sinks (see instrumentation.py); each gets
+        # one event dict per stage. Stage timings land in the metadata either way.
+        self.stage_callbacks = list(stage_callbacks or [])
+        self._defer_stage_events = False
+        # Byte budget for the final JPEG (e.g. 300 * 1024 for Instagram); when
+        # set, quality is searched downwards from self.quality to min_quality.
+        self.target_file_size = target_file_size
+        self.min_quality = min_quality
+        self.quality_memo_size = 4096
+        # Pool workers run on pickled copies, so what they add to the quality
+        # memo is returned with each result and merged by the parent.
+        self._in_worker = False
+        self._learned_qualities = []
+        # LRU of decoded and transformed frames (single_pass only), so a
+        # quality-only change just re-encodes. None disables it.
+        self.frame_memo_mb = frame_memo_mb
+        self._frame_memo = OrderedDict()
+        self._frame_memo_bytes = 0
+        # Pluggable output encoders. 'options' carries the effort/speed knobs:
+        # WebP method 0 (fast) .. 6 (smallest), AVIF speed 0 (slow) .. 10 (fast).
+        self.output_format = output_format
+        self.output_encoders = {
+            'jpeg': {'format': 'JPEG', 'extension': '.jpg', 'options': {'optimize': True, 'progressive': True}},
+            'webp': {'format': 'WEBP', 'extension': '.webp', 'options': {'method': 4}},
+            'avif': {'format': 'AVIF', 'extension': '.avif', 'options': {'speed': 6}}
+        }
+        self._quality_memo = OrderedDict()
+        # Output ladder for process_renditions. 'cover' crops to the exact size,
+        # 'contain' fits inside the box and keeps the aspect ratio.
+        self.rendition_configs = {
+            'instagram_portrait': {'size': (1080, 1350), 'fit': 'cover'},
+            'twitter': {'size': (1200, 675), 'fit': 'cover'},
+            'facebook': {'size': (1200, 630), 'fit': 'cover'},
+            'thumbnail': {'size': (320, 320), 'fit': 'contain'}
+        }
         self.enhancement_profiles = {
             'light': {'brightness': 1.05, 'contrast': 1.08, 'saturation': 1.05, 'sharpness': 1.1},
             'medium': {'brightness': 1.1, 'contrast': 1.15, 'saturation': 1.1, 'sharpness': 1.2},
             'strong': {'brightness': 1.15, 'contrast': 1.25, 'saturation': 1.15, 'sharpness': 1.3}
         }
+        # 'auto' builds a profile per image (see auto_enhancement_profiles);
+        # a profile's optional 'gamma' is applied after autocontrast.
+        # Denoising runs when the noise sigma at output size (0-255) is above
+        # threshold. 'filter' is 'gaussian', 'box' or 'median' (slow).
+        self.denoise_settings = {'threshold': 3.0, 'filter': 'gaussian', 'radius': 0.8, 'sample_size': 512}
+        self.auto_enhancement = {
+            'target_median_luminance': 0.5,
+            'target_saturation': 0.3,
+            'gamma_limits': (0.55, 1.4),
+            'saturation_limits': (1.0, 1.25),
+            'sharpness': 1.2,
+            'sample_size': 96
+        }
+    
+    def __getstate__(self) -> dict:
+        # Sinks can hold loggers, locks or in-memory state that must stay in
+        # the parent. Pool workers get none and ship their events back inside
+        # the metadata instead; _merge_worker_metadata replays them here.
+        state = self.__dict__.copy()
+        # Memoized frames are only useful to the parent; don't pickle them.
+        state['_frame_memo'] = OrderedDict()
+        state['_frame_memo_bytes'] = 0
+        state['_in_worker'] = True
+        state['_learned_qualities'] = []
+        if state['stage_callbacks']:
+            state['stage_callbacks'] = []
+            state['_defer_stage_events'] = True
+        return state
     
     def enhance_image(self, image_path: str, enhancement_level: str = 'medium') -> str:
         try:
-            image = Image.open(image_path).convert('RGB')
-            
-            profile = self.enhancement_profiles.get(enhancement_level, self.enhancement_profiles['medium'])
-            
-            image = self._enhance_brightness(image, profile['brightness'])
-            image = self._enhance_contrast(image, profile['contrast'])
-            image = self._enhance_saturation(image, profile['saturation'])
-            image = self._enhance_sharpness(image, profile['sharpness'])
-            image = self._auto_balance_colors(image)
-            image = self._reduce_noise(image)
+            image = self._open_image(image_path).convert('RGB')
+            image = self._apply_enhancements(image, enhancement_level, output_size=image.size)
             
             enhanced_path = image_path.replace('.', '_enhanced.')
             if not enhanced_path.endswith(('.jpg', '.jpeg')):
@@ -42,7 +246,9 @@ class PropertyImageProcessor:
     
     def resize_image(self, image_path: str, target_width: int = 1080, target_height: int = 810) -> str:
         try:
-            image = Image.open(image_path).convert('RGB')
+            image = self._open_image(image_path)
+            self._draft_for_target(image, (target_width, target_height))
+            image = image.convert('RGB')
             
             resized_image = self._smart_resize(image, (target_width, target_height))
             
@@ -58,7 +264,7 @@ class PropertyImageProcessor:
     
     def compress_image(self, image_path: str, quality: int = 85) -> str:
         try:
-            image = Image.open(image_path).convert('RGB')
+            image = self._open_image(image_path).convert('RGB')
             
             image = self._optimize_for_web(image)
             
@@ -72,52 +278,653 @@ class PropertyImageProcessor:
         except Exception as e:
             raise Exception(f"Error compressing {image_path}: {str(e)}")
     
-    def process_image(self, image_path: str, output_path: str = None, enhancement_level: str = 'medium') -> dict:
+    def process_image(self, image_path: str, output_path: str = None, enhancement_level: str = 'medium',
+                      pipeline: Optional[str] = None) -> dict:
         try:
+            pipeline = pipeline or self.pipeline
+            
             if output_path is None:
                 base_name = os.path.splitext(os.path.basename(image_path))[0]
-                output_path = os.path.join(os.path.dirname(image_path), f"{base_name}_processed.jpg")
+                extension = self._encoder(self._effective_format(pipeline))['extension']
+                output_path = os.path.join(os.path.dirname(image_path), f"{base_name}_processed{extension}")
             
-            original_size = os.path.getsize(image_path)
-            original_image = Image.open(image_path)
-            original_dimensions = original_image.size
+            cache_key = None
+            if self.cache is not None:
+                recorder = StageRecorder(image_path, self.stage_callbacks)
+                start = time.perf_counter()
+                cache_key = self._cache_key(image_path, enhancement_level, pipeline)
+                cached = self._fetch_cached(cache_key, output_path)
+                recorder.record('cache_lookup', time.perf_counter() - start,
+                                bytes_read=cached['final_file_size'] if cached else 0)
+                if cached is not None:
+                    cached['stage_timings_ms'] = recorder.timings_ms()
+                    return cached
             
-            enhanced_path = self.enhance_image(image_path, enhancement_level)
-            resized_path = self.resize_image(enhanced_path, *self.target_size)
-            final_path = self.compress_image(resized_path, self.quality)
+            return self._process_image_uncached(image_path, output_path, enhancement_level, pipeline, cache_key)
             
-            shutil.move(final_path, output_path)
+        except Exception as e:
+            return self._error_metadata(image_path, e)
+    
+    def _process_image_uncached(self, image_path: str, output_path: str, enhancement_level: str, pipeline: str,
+                                cache_key: Optional[str] = None) -> dict:
+        try:
+            recorder = StageRecorder(image_path, self.stage_callbacks)
             
-            for temp_path in [enhanced_path, resized_path]:
-                if os.path.exists(temp_path):
-                    os.remove(temp_path)
+            if pipeline == 'multi_pass':
+                stage_info = self._process_multi_pass(image_path, output_path, enhancement_level, recorder)
+            else:
+                stage_info = self._process_single_pass(image_path, output_path, enhancement_level, recorder)
             
-            final_size = os.path.getsize(output_path)
-            final_image = Image.open(output_path)
-            final_dimensions = final_image.size
+            return self._success_metadata(image_path, output_path, enhancement_level, pipeline, stage_info,
+                                          recorder, cache_key)
             
-            compression_ratio = (1 - final_size / original_size) * 100
+        except Exception as e:
+            return self._error_metadata(image_path, e)
+    
+    def _success_metadata(self, image_path: str, output_path: str, enhancement_level: str, pipeline: str,
+                          stage_info: dict, recorder: StageRecorder, cache_key: Optional[str] = None) -> dict:
+        original_size = os.path.getsize(image_path)
+        final_size = os.path.getsize(output_path)
+        compression_ratio = (1 - final_size / original_size) * 100
+        
+        metadata = {
+            'status': 'success',
+            'original_file_size': original_size,
+            'final_file_size': final_size,
+            'compression_ratio': f"{compression_ratio:.1f}%",
+            'original_dimensions': stage_info.pop('original_dimensions'),
+            'final_dimensions': stage_info.pop('final_dimensions'),
+            'enhancement_level': enhancement_level,
+            'quality_setting': self.quality,
+            'pipeline': pipeline,
+            'stage_order': self.stage_order,
+            'output_path': output_path
+        }
+        metadata.update(stage_info)
+        
+        if cache_key is not None:
+            cache_change = self.cache.store(cache_key, output_path, metadata)
+            metadata['cache_hit'] = False
+            if self._in_worker:
+                metadata['_cache_change'] = cache_change
+        
+        metadata['stage_timings_ms'] = recorder.timings_ms()
+        if self._defer_stage_events:
+            metadata['_stage_events'] = recorder.events
+        if self._learned_qualities:
+            metadata['_learned_qualities'], self._learned_qualities = self._learned_qualities, []
+        
+        return metadata
+    
+    def process_renditions(self, image_path: str, output_dir: str, renditions: Optional[List[str]] = None,
+                           enhancement_level: str = 'medium') -> dict:
+        # Decodes and enhances once, then serves every rendition from the
+        # nearest level of a 2x resolution pyramid built from that buffer.
+        try:
+            os.makedirs(output_dir, exist_ok=True)
+            renditions = renditions or list(self.rendition_configs)
+            configs = {name: self.rendition_configs[name] for name in renditions}
+            base_name = os.path.splitext(os.path.basename(image_path))[0]
+            
+            with self._open_image(image_path) as source:
+                original_dimensions = source.size
+                target_sizes = {name: self._rendition_resize_size(source.size, config) for name, config in configs.items()}
+                decode_size = (max(size[0] for size in target_sizes.values()),
+                               max(size[1] for size in target_sizes.values()))
+                if source.format == 'JPEG':
+                    source.draft('RGB', decode_size)
+                image = source.convert('RGB')
+            
+            if image.width > decode_size[0] * 2 and image.height > decode_size[1] * 2:
+                image = image.resize(self._cover_size(image.size, decode_size), Image.Resampling.LANCZOS,
+                                     reducing_gap=self.resize_reducing_gap)
+            # The largest rendition keeps the most noise, so it sets the gate.
+            image = self._apply_enhancements(image, enhancement_level, output_size=decode_size)
             
-            metadata = {
+            smallest = (min(size[0] for size in target_sizes.values()),
+                        min(size[1] for size in target_sizes.values()))
+            pyramid = self._build_pyramid(image, smallest)
+            
+            transform_key = None
+            results = {}
+            for name, config in configs.items():
+                level_index, level = self._nearest_pyramid_level(pyramid, target_sizes[name])
+                
+                crop_box = None
+                if config.get('fit', 'cover') == 'cover':
+                    rendition = self._cover_resize(level, config['size'])
+                    box = self._crop_box(rendition, config['size'], config.get('crop_mode'))
+                    crop_box = self._source_box(box, rendition.size, original_dimensions)
+                    rendition = rendition.crop(box)
+                else:
+                    rendition = level.resize(target_sizes[name], Image.Resampling.LANCZOS,
+                                             reducing_gap=self.resize_reducing_gap)
+                rendition = self._optimize_for_web(rendition)
+                
+                output_format = config.get('format', self.output_format)
+                extension = self._encoder(output_format)['extension']
+                output_path = os.path.join(output_dir, f"{base_name}_{name}{extension}")
+                
+                max_bytes = config.get('max_file_size')
+                frame_key = None
+                if max_bytes:
+                    transform_key = transform_key or self._frame_memo_keys(hash_file(image_path), enhancement_level)[1]
+                    frame_key = transform_key + (name, json.dumps(config, sort_keys=True))
+                rendition_info = self._write_output(rendition, output_path, output_format,
+                                                    config.get('quality', self.quality), max_bytes,
+                                                    frame_key, config.get('encoder_options'))
+                
+                results[name] = {
+                    'output_path': output_path,
+                    'dimensions': rendition.size,
+                    'file_size': os.path.getsize(output_path),
+                    'pyramid_level': level_index,
+                    'crop_box': crop_box,
+                    **rendition_info
+                }
+            
+            return {
                 'status': 'success',
-                'original_file_size': original_size,
-                'final_file_size': final_size,
-                'compression_ratio': f"{compression_ratio:.1f}%",
                 'original_dimensions': original_dimensions,
-                'final_dimensions': final_dimensions,
+                'original_file_size': os.path.getsize(image_path),
                 'enhancement_level': enhancement_level,
-                'quality_setting': self.quality,
-                'output_path': output_path
+                'pyramid_levels': [level.size for level in pyramid],
+                'renditions': results
             }
             
-            return metadata
-            
         except Exception as e:
-            return {
-                'status': 'error',
-                'error': str(e),
-                'input_path': image_path
-            }
+            return self._error_metadata(image_path, e)
+    
+    def _error_metadata(self, image_path: str, error: Union[Exception, str]) -> dict:
+        return {
+            'status': 'error',
+            'error': str(error),
+            'input_path': image_path
+        }
+    
+    def _cache_key(self, image_path: str, enhancement_level: str, pipeline: str) -> str:
+        settings = {
+            'pipeline_version': PIPELINE_VERSION,
+            'enhancement_level': enhancement_level,
+            'enhancement_profile': self.enhancement_profiles.get(enhancement_level),
+            'auto_enhancement': self.auto_enhancement if enhancement_level == 'auto' else None,
+            'quality': self.quality,
+            'target_size': list(self.target_size),
+            'pipeline': pipeline,
+            'enhancement_engine': self.enhancement_engine,
+            'stage_order': self.stage_order,
+            'target_file_size': self.target_file_size,
+            'min_quality': self.min_quality,
+            'output_format': self._effective_format(pipeline),
+            'encoder': self.output_encoders.get(self._effective_format(pipeline)),
+            'max_image_pixels': self.max_image_pixels,
+            'memory_budget_mb': self.memory_budget_mb,
+            'oversize_strategy': self.oversize_strategy,
+            'crop': self._crop_settings(),
+            'denoise': self.denoise_settings
+        }
+        return self.cache.make_key(image_path, settings)
+    
+    def _fetch_cached(self, cache_key: str, output_path: str) -> Optional[dict]:
+        metadata = self.cache.fetch(cache_key, output_path)
+        if metadata is None:
+            return None
+        
+        metadata['original_dimensions'] = tuple(metadata['original_dimensions'])
+        metadata['final_dimensions'] = tuple(metadata['final_dimensions'])
+        if 'working_dimensions' in metadata:
+            metadata['working_dimensions'] = tuple(metadata['working_dimensions'])
+        metadata['cache_hit'] = True
+        return metadata
+    
+    def _process_single_pass(self, image_path: str, output_path: str, enhancement_level: str,
+                             recorder: Optional[StageRecorder] = None) -> dict:
+        if self.frame_memo_mb:
+            image, stage_info = self._memoized_frame(image_path, enhancement_level, recorder)
+        else:
+            image, stage_info, plan = self._decode_stage(image_path, recorder)
+            image = self._transform_stage(image, enhancement_level, plan, stage_info, recorder)
+        stage_info.update(self._encode_stage(image, image_path, output_path, enhancement_level, recorder))
+        return stage_info
+    
+    def _memoized_frame(self, image_path: str, enhancement_level: str,
+                        recorder: Optional[StageRecorder] = None) -> Tuple[Image.Image, dict]:
+        # Entries are private copies: the tiled engine pastes into its input,
+        # so frames handed to _transform_stage must not alias the memo.
+        image_hash = hash_file(image_path)
+        decode_key, frame_key = self._frame_memo_keys(image_hash, enhancement_level)
+        
+        entry = self._frame_memo_get(frame_key)
+        if entry is not None:
+            image, stage_info = entry
+            return image, dict(stage_info, frame_memo='transformed')
+        
+        entry = self._frame_memo_get(decode_key)
+        if entry is not None:
+            image, stage_info, plan = entry
+            image, stage_info, memo_state = image.copy(), dict(stage_info), 'decoded'
+        else:
+            image, stage_info, plan = self._decode_stage(image_path, recorder)
+            self._frame_memo_put(decode_key, (image.copy(), dict(stage_info), plan), image.size)
+            memo_state = 'miss'
+        
+        image = self._transform_stage(image, enhancement_level, plan, stage_info, recorder)
+        self._frame_memo_put(frame_key, (image, dict(stage_info)), image.size)
+        stage_info['frame_memo'] = memo_state
+        return image, stage_info
+    
+    def _frame_memo_keys(self, image_hash: str, enhancement_level: str) -> Tuple[tuple, tuple]:
+        # Everything that changes the decoded frame, then everything that
+        # changes enhancement and resizing on top of it. Encode settings
+        # (quality, format, byte budget) are deliberately left out.
+        decode_settings = {
+            'stage_order': self.stage_order,
+            'target_size': list(self.target_size),
+            'enhancement_engine': self.enhancement_engine,
+            'max_image_pixels': self.max_image_pixels,
+            'memory_budget_mb': self.memory_budget_mb,
+            'oversize_strategy': self.oversize_strategy,
+            'resize_reducing_gap': self.resize_reducing_gap
+        }
+        transform_settings = {
+            'enhancement_level': enhancement_level,
+            'enhancement_profile': self.enhancement_profiles.get(enhancement_level),
+            'auto_enhancement': self.auto_enhancement if enhancement_level == 'auto' else None,
+            'crop': self._crop_settings(),
+            'denoise': self.denoise_settings
+        }
+        decode_key = (image_hash, 'decoded', json.dumps(decode_settings, sort_keys=True))
+        return decode_key, decode_key[:1] + ('transformed', decode_key[2], json.dumps(transform_settings, sort_keys=True))
+    
+    def _frame_memo_get(self, key: tuple) -> Optional[tuple]:
+        item = self._frame_memo.get(key)
+        if item is None:
+            return None
+        self._frame_memo.move_to_end(key)
+        return item[0]
+    
+    def _frame_memo_put(self, key: tuple, entry: tuple, size: Tuple[int, int]) -> None:
+        budget = self.frame_memo_mb * 1024 * 1024
+        nbytes = size[0] * size[1] * self.stage_bytes_per_pixel['buffer']
+        if nbytes > budget:
+            return
+        if key in self._frame_memo:
+            self._frame_memo_bytes -= self._frame_memo.pop(key)[1]
+        self._frame_memo[key] = (entry, nbytes)
+        self._frame_memo_bytes += nbytes
+        while self._frame_memo_bytes > budget:
+            self._frame_memo_bytes -= self._frame_memo.popitem(last=False)[1][1]
+    
+    def clear_frame_memo(self) -> None:
+        self._frame_memo.clear()
+        self._frame_memo_bytes = 0
+    
+    def _decode_stage(self, image_path: str, recorder: Optional[StageRecorder] = None) -> Tuple[Image.Image, dict, dict]:
+        start = time.perf_counter()
+        image, original_dimensions, plan = self._decode_within_budget(image_path)
+        if recorder is not None:
+            recorder.record('decode', time.perf_counter() - start, pixels=image.width * image.height,
+                            bytes_read=os.path.getsize(image_path))
+        
+        stage_info = {
+            'original_dimensions': original_dimensions,
+            'working_dimensions': image.size,
+            'memory_strategy': plan['strategy'],
+            'peak_memory_mb': round(plan['peak_bytes'] / (1024 * 1024), 1)
+        }
+        if self.memory_budget_mb is not None:
+            stage_info['memory_budget_mb'] = self.memory_budget_mb
+            stage_info['within_memory_budget'] = plan['peak_bytes'] <= self.memory_budget_mb * 1024 * 1024
+        return image, stage_info, plan
+    
+    def _transform_stage(self, image: Image.Image, enhancement_level: str, plan: dict, stage_info: dict,
+                         recorder: Optional[StageRecorder] = None) -> Image.Image:
+        if enhancement_level == 'auto':
+            profile = self._stage(recorder, 'auto_profile', self._resolve_profile, enhancement_level, image)
+        else:
+            profile = self._resolve_profile(enhancement_level, image)
+        
+        if self.stage_order == 'resize_first':
+            image = self._resize_stage(image, stage_info, recorder)
+            denoise = self._noise_stage(image, stage_info, recorder)
+            image = self._apply_enhancements(image, enhancement_level, recorder, plan['tile_rows'], profile, denoise)
+        else:
+            denoise = self._noise_stage(image, stage_info, recorder)
+            image = self._apply_enhancements(image, enhancement_level, recorder, plan['tile_rows'], profile, denoise)
+            image = self._resize_stage(image, stage_info, recorder)
+        image = self._stage(recorder, 'web_sharpen', self._optimize_for_web, image)
+        
+        stage_info['final_dimensions'] = image.size
+        if enhancement_level == 'auto':
+            stage_info['enhancement_profile'] = profile
+        return image
+    
+    def _noise_stage(self, image: Image.Image, stage_info: dict, recorder: Optional[StageRecorder] = None) -> bool:
+        noise = self._stage(recorder, 'noise_estimate', self._estimate_noise, image)
+        stage_info['noise_level'] = round(noise, 2)
+        stage_info['denoised'] = noise > self.denoise_settings['threshold']
+        return stage_info['denoised']
+    
+    def _resize_stage(self, image: Image.Image, stage_info: dict,
+                      recorder: Optional[StageRecorder] = None) -> Image.Image:
+        image = self._stage(recorder, 'resize', self._cover_resize, image, self.target_size)
+        if self.crop_mode == 'saliency':
+            box = self._stage(recorder, 'crop_search', self._crop_box, image, self.target_size)
+        else:
+            box = self._crop_box(image, self.target_size)
+        stage_info['crop_box'] = self._source_box(box, image.size, stage_info['original_dimensions'])
+        return image.crop(box)
+    
+    def _encode_stage(self, image: Image.Image, image_path: str, output_path: str, enhancement_level: str,
+                      recorder: Optional[StageRecorder] = None) -> dict:
+        start = time.perf_counter()
+        # The quality memo is keyed on the frame being encoded, so any
+        # change to sizing, enhancement or cropping starts a fresh search.
+        frame_key = None
+        if self.target_file_size:
+            frame_key = self._frame_memo_keys(hash_file(image_path), enhancement_level)[1]
+        info = self._write_output(image, output_path, self.output_format, self.quality,
+                                  self.target_file_size, frame_key)
+        if recorder is not None:
+            recorder.record('encode', time.perf_counter() - start, pixels=image.width * image.height,
+                            bytes_written=os.path.getsize(output_path))
+        return info
+    
+    def _process_multi_pass(self, image_path: str, output_path: str, enhancement_level: str,
+                            recorder: Optional[StageRecorder] = None) -> dict:
+        original_dimensions = read_image_header(image_path)['dimensions']
+        
+        enhanced_path = self._stage(recorder, 'enhance_file', self.enhance_image, image_path, enhancement_level)
+        resized_path = self._stage(recorder, 'resize_file', self.resize_image, enhanced_path, *self.target_size)
+        final_path = self._stage(recorder, 'compress_file', self.compress_image, resized_path, self.quality)
+        
+        shutil.move(final_path, output_path)
+        
+        for temp_path in [enhanced_path, resized_path]:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        
+        # compress_image never changes the size resize_image produced.
+        return {'original_dimensions': original_dimensions, 'final_dimensions': tuple(self.target_size),
+                'output_format': 'jpeg'}
+    
+    def supported_output_formats(self) -> List[str]:
+        Image.init()
+        return [name for name, encoder in self.output_encoders.items() if encoder['format'] in Image.SAVE]
+    
+    def _encoder(self, output_format: str) -> dict:
+        if output_format not in self.output_encoders:
+            raise Exception(f"Unknown output format '{output_format}'")
+        return self.output_encoders[output_format]
+    
+    def _effective_format(self, pipeline: str) -> str:
+        # The multi-pass chain predates pluggable encoders and always writes JPEG.
+        return 'jpeg' if pipeline == 'multi_pass' else self.output_format
+    
+    def _encode(self, image: Image.Image, output_format: str, quality: int,
+                encoder_options: Optional[dict] = None) -> bytes:
+        encoder = self._encoder(output_format)
+        if output_format not in self.supported_output_formats():
+            raise Exception(f"Output format '{output_format}' is not supported by this Pillow build")
+        
+        options = dict(encoder['options'], **(encoder_options or {}))
+        buffer = io.BytesIO()
+        image.save(buffer, encoder['format'], quality=quality, **options)
+        return buffer.getvalue()
+    
+    def _write_output(self, image: Image.Image, output_path: str, output_format: str, quality: int,
+                      max_bytes: Optional[int] = None, frame_key: Optional[tuple] = None,
+                      encoder_options: Optional[dict] = None) -> dict:
+        if max_bytes:
+            data, info = self._encode_to_budget(image, max_bytes, frame_key, output_format, quality, encoder_options)
+        else:
+            data, info = self._encode(image, output_format, quality, encoder_options), {}
+        
+        with open(output_path, 'wb') as f:
+            f.write(data)
+        info['output_format'] = output_format
+        return info
+    
+    def _encode_to_budget(self, image: Image.Image, max_bytes: int, frame_key: tuple, output_format: str = 'jpeg',
+                          quality: Optional[int] = None, encoder_options: Optional[dict] = None) -> Tuple[bytes, dict]:
+        # Highest quality in [min_quality, quality] that fits the byte budget.
+        # Starts from the quality remembered for this frame, if any.
+        ceiling = quality or self.quality
+        memo_key = (frame_key, max_bytes, output_format, ceiling, json.dumps(encoder_options or {}, sort_keys=True))
+        encodes = 0
+        
+        def encode(candidate):
+            return self._encode(image, output_format, candidate, encoder_options)
+        
+        low, high = self.min_quality, ceiling
+        best_quality, best_data = None, None
+        remembered = self._quality_memo.get(memo_key)
+        if remembered is not None:
+            self._quality_memo.move_to_end(memo_key)
+            data = encode(remembered)
+            encodes += 1
+            if len(data) <= max_bytes:
+                best_quality, best_data = remembered, data
+                low = remembered + 1
+                if low <= high:
+                    data = encode(low)
+                    encodes += 1
+                    if len(data) <= max_bytes:
+                        best_quality, best_data = low, data
+                        low += 1
+                    else:
+                        high = low - 1
+            else:
+                high = remembered - 1
+        else:
+            # Try the ceiling first: most photos already fit and need one encode.
+            data = encode(high)
+            encodes += 1
+            if len(data) <= max_bytes:
+                best_quality, best_data = high, data
+            high -= 1
+            if best_quality is not None:
+                low = high + 1
+        
+        while low <= high:
+            quality = (low + high) // 2
+            data = encode(quality)
+            encodes += 1
+            if len(data) <= max_bytes:
+                best_quality, best_data = quality, data
+                low = quality + 1
+            else:
+                high = quality - 1
+        
+        within_budget = best_quality is not None
+        if not within_budget:
+            # Even the floor quality is over budget. The search always ends
+            # on the floor in that case, so ship that encode.
+            best_quality, best_data = min(self.min_quality, ceiling), data
+        
+        self._quality_memo[memo_key] = best_quality
+        if len(self._quality_memo) > self.quality_memo_size:
+            self._quality_memo.popitem(last=False)
+        if self._in_worker:
+            self._learned_qualities.append((memo_key, best_quality))
+        
+        return best_data, self._budget_info(max_bytes, best_quality, encodes, within_budget)
+    
+    def _budget_info(self, max_bytes: int, quality: int, encodes: int, within_budget: bool) -> dict:
+        return {
+            'target_file_size': max_bytes,
+            'encode_quality': quality,
+            'quality_search_encodes': encodes,
+            'target_met': within_budget
+        }
+    
+    def _apply_enhancements(self, image: Image.Image, enhancement_level: str,
+                            recorder: Optional[StageRecorder] = None, tile_rows: Optional[int] = None,
+                            profile: Optional[dict] = None, denoise: Optional[bool] = None,
+                            output_size: Optional[Tuple[int, int]] = None) -> Image.Image:
+        # Denoising runs first so the sharpening steps don't amplify the noise.
+        # output_size is what the frame is finally saved at, for the noise gate.
+        profile = profile or self._resolve_profile(enhancement_level, image)
+        if denoise is None:
+            denoise = self._estimate_noise(image, output_size) > self.denoise_settings['threshold']
+        
+        if self.enhancement_engine == 'fused':
+            if tile_rows is not None:
+                return self._apply_tiled_enhancements(image, profile, tile_rows, recorder, denoise)
+            return self._apply_fused_enhancements(image, profile, recorder, denoise)
+        
+        if denoise:
+            image = self._stage(recorder, 'denoise', self._reduce_noise, image)
+        image = self._stage(recorder, 'brightness', self._enhance_brightness, image, profile['brightness'])
+        image = self._stage(recorder, 'contrast', self._enhance_contrast, image, profile['contrast'])
+        image = self._stage(recorder, 'saturation', self._enhance_saturation, image, profile['saturation'])
+        image = self._stage(recorder, 'sharpness', self._enhance_sharpness, image, profile['sharpness'])
+        image = self._stage(recorder, 'autocontrast', self._auto_balance_colors, image)
+        if profile.get('gamma', 1.0) != 1.0:
+            image = self._stage(recorder, 'gamma', image.point, self._gamma_table(profile['gamma']) * 3)
+        return image
+    
+    def _apply_fused_enhancements(self, image: Image.Image, profile: dict,
+                                  recorder: Optional[StageRecorder] = None, denoise: bool = False) -> Image.Image:
+        # Same order as the chain, since saturation and sharpening don't
+        # commute with the clipping around them.
+        if denoise:
+            image = self._stage(recorder, 'denoise', self._reduce_noise, image)
+        tone_lut, balance_lut = self._stage(recorder, 'lut_statistics', self._build_enhancement_luts, image, profile)
+        image = self._stage(recorder, 'tone_lut', image.point, tone_lut)
+        image = self._stage(recorder, 'saturation', self._saturate, image, profile['saturation'])
+        image = self._stage(recorder, 'sharpness', self._enhance_sharpness, image, profile['sharpness'])
+        image = self._stage(recorder, 'balance_lut', image.point, balance_lut)
+        return image
+    
+    def _apply_tiled_enhancements(self, image: Image.Image, profile: dict, tile_rows: int,
+                                  recorder: Optional[StageRecorder] = None, denoise: bool = False) -> Image.Image:
+        # Enhances strip by strip, pasting back into image in place. LUT
+        # statistics still see the whole frame, so output matches the fused path.
+        if denoise:
+            image = self._stage(recorder, 'denoise', self._filter_strips, image, tile_rows, self._reduce_noise)
+        tone_lut, balance_lut = self._stage(recorder, 'lut_statistics', self._build_enhancement_luts, image, profile)
+        image = self._stage(recorder, 'tone_lut', self._map_strips, image, tile_rows,
+                            lambda strip: self._saturate(strip.point(tone_lut), profile['saturation']))
+        image = self._stage(recorder, 'sharpness', self._filter_strips, image, tile_rows,
+                            lambda strip: self._enhance_sharpness(strip, profile['sharpness']))
+        image = self._stage(recorder, 'balance_lut', self._map_strips, image, tile_rows,
+                            lambda strip: strip.point(balance_lut))
+        return image
+    
+    def _map_strips(self, image: Image.Image, rows: int, func) -> Image.Image:
+        for top in range(0, image.height, rows):
+            box = (0, top, image.width, min(top + rows, image.height))
+            image.paste(func(image.crop(box)), box[:2])
+        return image
+    
+    def _filter_strips(self, image: Image.Image, rows: int, func) -> Image.Image:
+        # Strips are written back as they finish, so the rows above the current
+        # strip are kept from before the paste that overwrote them.
+        width, height = image.size
+        overlap = self.tile_overlap
+        rows = max(rows, overlap)
+        above = None
+        for top in range(0, height, rows):
+            bottom = min(top + rows, height)
+            window = image.crop((0, top, width, min(bottom + overlap, height)))
+            offset = 0
+            if above is not None:
+                offset = above.height
+                padded = Image.new(image.mode, (width, offset + window.height))
+                padded.paste(above, (0, 0))
+                padded.paste(window, (0, offset))
+                window = padded
+            
+            filtered = func(window)
+            above = image.crop((0, max(top, bottom - overlap), width, bottom))
+            image.paste(filtered.crop((0, offset, width, offset + bottom - top)), (0, top))
+        return image
+    
+    def _resolve_profile(self, enhancement_level: str, image: Image.Image) -> dict:
+        if enhancement_level == 'auto':
+            return self.auto_enhancement_profiles(self._auto_sample(image)[None])[0]
+        return self.enhancement_profiles.get(enhancement_level, self.enhancement_profiles['medium'])
+    
+    def _auto_sample(self, image: Image.Image) -> np.ndarray:
+        size = self.auto_enhancement['sample_size']
+        sample = image.resize((size, size), Image.Resampling.NEAREST)
+        return np.asarray(sample if sample.mode == 'RGB' else sample.convert('RGB'))
+    
+    def auto_enhancement_profiles(self, samples: np.ndarray) -> List[dict]:
+        # samples is a uint8 (images, height, width, 3) stack of thumbnails.
+        # Midtones move with gamma, since autocontrast undoes linear changes.
+        settings = self.auto_enhancement
+        pixels = samples.reshape(len(samples), -1, 3).astype(np.float32) / 255
+        
+        # Predict the per-channel 1% autocontrast stretch, then measure there.
+        low, high = np.percentile(pixels, [1, 99], axis=1)
+        pixels -= low[:, None, :]
+        pixels /= np.maximum(high - low, 1e-3)[:, None, :]
+        np.clip(pixels, 0, 1, out=pixels)
+        
+        median = np.clip(np.median(self._luminance(pixels), axis=1), 0.02, 0.98)
+        gamma = np.clip(np.log(settings['target_median_luminance']) / np.log(median), *settings['gamma_limits'])
+        
+        brightest = pixels.max(axis=2)
+        saturation = ((brightest - pixels.min(axis=2)) / np.maximum(brightest, 1e-3)).mean(axis=1)
+        saturation_factor = np.clip(settings['target_saturation'] / np.maximum(saturation, 1e-3),
+                                    *settings['saturation_limits'])
+        
+        return [{'brightness': 1.0, 'contrast': 1.0, 'saturation': round(float(factor), 3),
+                 'sharpness': settings['sharpness'], 'gamma': round(float(value), 3)}
+                for value, factor in zip(gamma, saturation_factor)]
+    
+    def _gamma_table(self, gamma: float) -> list:
+        levels = np.arange(256, dtype=np.float32) / 255
+        return np.round(levels ** gamma * 255).astype(np.uint8).tolist()
+    
+    def _stage(self, recorder: Optional[StageRecorder], stage: str, func, *args):
+        if recorder is None:
+            return func(*args)
+        return recorder.run(stage, func, *args)
+    
+    def _build_enhancement_luts(self, image: Image.Image, profile: dict) -> Tuple[list, list]:
+        # Returns the brightness+contrast and autocontrast(+gamma) tables,
+        # with statistics from a NEAREST thumbnail, rounding as ImageEnhance does.
+        scale = max(1, max(image.size) // self.stats_thumbnail_size)
+        sample_size = (max(1, image.width // scale), max(1, image.height // scale))
+        thumb = image.resize(sample_size, Image.Resampling.NEAREST)
+        
+        levels = np.arange(256, dtype=np.float32)
+        brightened = np.clip(levels * profile['brightness'], 0, 255).astype(np.uint8).astype(np.float32)
+        mean = int(self._luminance(brightened[np.asarray(thumb)]).mean() + 0.5)
+        contrasted = np.clip(mean + (brightened - mean) * profile['contrast'], 0, 255).astype(np.uint8)
+        tone_lut = contrasted.tolist() * 3
+        
+        thumb_pixels = np.asarray(self._saturate(thumb.point(tone_lut), profile['saturation']))
+        balance_lut = []
+        for channel in range(3):
+            histogram = np.bincount(thumb_pixels[..., channel].ravel(), minlength=256)
+            lo, hi = self._autocontrast_bounds(histogram, cutoff=1)
+            if hi <= lo:
+                stretched = levels
+            else:
+                stretched = (levels - lo) * (255.0 / (hi - lo))
+            stretched = np.clip(stretched, 0, 255).astype(np.uint8)
+            if profile.get('gamma', 1.0) != 1.0:
+                stretched = np.asarray(self._gamma_table(profile['gamma']), dtype=np.uint8)[stretched]
+            balance_lut.extend(stretched.tolist())
+        return tone_lut, balance_lut
+    
+    def _autocontrast_bounds(self, histogram: np.ndarray, cutoff: float = 1) -> Tuple[int, int]:
+        cut = int(histogram.sum() * cutoff // 100)
+        lo = int(np.argmax(np.cumsum(histogram) > cut))
+        hi = 255 - int(np.argmax(np.cumsum(histogram[::-1]) > cut))
+        return lo, hi
+    
+    def _saturate(self, image: Image.Image, factor: float) -> Image.Image:
+        # Blends against the luma in uint8, like ImageEnhance.Color, without
+        # widening the frame to float.
+        return Image.blend(image.convert('L').convert(image.mode), image, factor)
+    
+    def _luminance(self, pixels: np.ndarray) -> np.ndarray:
+        return pixels[..., 0] * 0.299 + pixels[..., 1] * 0.587 + pixels[..., 2] * 0.114
     
     def _enhance_brightness(self, image: Image.Image, factor: float) -> Image.Image:
         enhancer = ImageEnhance.Brightness(image)
@@ -139,28 +946,195 @@ class PropertyImageProcessor:
         return ImageOps.autocontrast(image, cutoff=1)
     
     def _reduce_noise(self, image: Image.Image) -> Image.Image:
-        return image.filter(ImageFilter.MedianFilter(size=1))
+        return image.filter(self._denoise_filter())
+    
+    def _denoise_filter(self) -> ImageFilter.Filter:
+        settings = self.denoise_settings
+        if settings['filter'] == 'median':
+            return ImageFilter.MedianFilter(2 * round(settings['radius']) + 1)
+        if settings['filter'] == 'box':
+            return ImageFilter.BoxBlur(settings['radius'])
+        return ImageFilter.GaussianBlur(settings['radius'])
+    
+    def _estimate_noise(self, image: Image.Image, output_size: Optional[Tuple[int, int]] = None) -> float:
+        # Median absolute 3x3 Laplacian on a NEAREST sample, scaled to the
+        # output size (target_size unless given).
+        size = self.denoise_settings['sample_size']
+        factor = min(1.0, size / min(image.size))
+        sample = image.resize((max(3, round(image.width * factor)), max(3, round(image.height * factor))),
+                              Image.Resampling.NEAREST)
+        gray = np.asarray(sample.convert('L'), dtype=np.int16)
+        laplacian = (gray[:-2, :-2] + gray[:-2, 2:] + gray[2:, :-2] + gray[2:, 2:]
+                     - 2 * (gray[:-2, 1:-1] + gray[2:, 1:-1] + gray[1:-1, :-2] + gray[1:-1, 2:])
+                     + 4 * gray[1:-1, 1:-1])
+        sigma = float(np.median(np.abs(laplacian))) / (0.6745 * 6)
+        return sigma * min(1.0, self._cover_size(image.size, output_size or self.target_size)[0] / image.width)
+    
+    def _open_image(self, image_path: str) -> Image.Image:
+        return open_image(image_path, self.max_image_pixels)
+    
+    def _decode_within_budget(self, image_path: str) -> Tuple[Image.Image, Tuple[int, int], dict]:
+        with self._open_image(image_path) as source:
+            original_dimensions = source.size
+            floor_size = self._cover_size(source.size, self.target_size)
+            work_size = floor_size if self.stage_order == 'resize_first' else source.size
+            plan = self._memory_plan(work_size, floor_size)
+            
+            # libjpeg decodes straight to the smallest DCT scale covering the
+            # working size; other formats decode in full and are reduced below.
+            if source.format == 'JPEG':
+                source.draft('RGB', plan['work_size'])
+            decoded_size, decoded_mode = source.size, source.mode
+            # Reusing the decoded frame when it is already RGB avoids a
+            # full-size copy that convert() would make.
+            image = source if source.mode == 'RGB' else source.convert('RGB')
+            image.load()
+        
+        if plan['strategy'].startswith('downscaled') and image.size != plan['work_size']:
+            image = image.resize(plan['work_size'], Image.Resampling.LANCZOS, reducing_gap=self.resize_reducing_gap)
+        
+        plan['peak_bytes'] = max(self._decode_peak_bytes(decoded_size, decoded_mode, image.size),
+                                 self._enhancement_peak_bytes(plan['work_size'], plan['tile_rows']))
+        return image, original_dimensions, plan
+    
+    def _memory_plan(self, work_size: Tuple[int, int], floor_size: Tuple[int, int]) -> dict:
+        plan = {'strategy': 'full_frame', 'work_size': work_size, 'tile_rows': None}
+        if self.memory_budget_mb is None:
+            return plan
+        
+        budget = self.memory_budget_mb * 1024 * 1024
+        if self._enhancement_peak_bytes(work_size) <= budget:
+            return plan
+        
+        tiled = self.oversize_strategy == 'tile' and self.enhancement_engine == 'fused'
+        if not tiled or self._enhancement_peak_bytes(work_size, self._tile_rows(work_size, budget)) > budget:
+            work_size = self._fit_to_budget(work_size, floor_size, budget, tiled)
+            plan['strategy'] = 'downscaled'
+        if tiled and self._enhancement_peak_bytes(work_size) > budget:
+            plan['tile_rows'] = self._tile_rows(work_size, budget)
+            plan['strategy'] = 'tiled' if plan['strategy'] == 'full_frame' else 'downscaled_tiled'
+        
+        plan['work_size'] = work_size
+        return plan
     
-    def _smart_resize(self, image: Image.Image, target_size: Tuple[int, int]) -> Image.Image:
-        img_ratio = image.width / image.height
+    def _fit_to_budget(self, size: Tuple[int, int], floor_size: Tuple[int, int], budget: float,
+                       tiled: bool) -> Tuple[int, int]:
+        # Largest scale whose working set fits, but never below the size the
+        # target crop needs; if even that is over budget the plan reports it.
+        def scaled(scale):
+            return max(1, round(size[0] * scale)), max(1, round(size[1] * scale))
+        
+        def peak(candidate):
+            return self._enhancement_peak_bytes(candidate, self._tile_rows(candidate, budget) if tiled else None)
+        
+        low = min(1.0, max(floor_size[0] / size[0], floor_size[1] / size[1]))
+        high = 1.0
+        for _ in range(20):
+            middle = (low + high) / 2
+            if peak(scaled(middle)) <= budget:
+                low = middle
+            else:
+                high = middle
+        return scaled(low)
+    
+    def _tile_rows(self, size: Tuple[int, int], budget: float) -> int:
+        spare = budget - size[0] * size[1] * self.stage_bytes_per_pixel['buffer']
+        rows = int(spare // (size[0] * self.stage_bytes_per_pixel['fused'])) - 2 * self.tile_overlap
+        return max(self.tile_min_rows, rows)
+    
+    def _enhancement_peak_bytes(self, size: Tuple[int, int], tile_rows: Optional[int] = None) -> int:
+        width, height = size
+        if tile_rows is None:
+            return width * height * self.stage_bytes_per_pixel[self.enhancement_engine]
+        strip_height = min(height, tile_rows + 2 * self.tile_overlap)
+        return (width * height * self.stage_bytes_per_pixel['buffer'] +
+                width * strip_height * self.stage_bytes_per_pixel['fused'])
+    
+    def _decode_peak_bytes(self, decoded_size: Tuple[int, int], decoded_mode: str,
+                           work_size: Tuple[int, int]) -> int:
+        decoded_pixels = decoded_size[0] * decoded_size[1]
+        buffer = self.stage_bytes_per_pixel['buffer']
+        peak = decoded_pixels * (1 if decoded_mode in ('1', 'L', 'P') else buffer)
+        if decoded_mode != 'RGB':
+            peak += decoded_pixels * buffer
+        if work_size != decoded_size:
+            peak += work_size[0] * work_size[1] * buffer
+        return peak
+    
+    def _cover_size(self, size: Tuple[int, int], target_size: Tuple[int, int]) -> Tuple[int, int]:
+        img_ratio = size[0] / size[1]
         target_ratio = target_size[0] / target_size[1]
         
         if img_ratio > target_ratio:
-            new_height = target_size[1]
-            new_width = int(new_height * img_ratio)
-            image = image.resize((new_width, new_height), Image.Resampling.LANCZOS)
-            
-            left = (new_width - target_size[0]) // 2
-            image = image.crop((left, 0, left + target_size[0], target_size[1]))
-        else:
-            new_width = target_size[0]
-            new_height = int(new_width / img_ratio)
-            image = image.resize((new_width, new_height), Image.Resampling.LANCZOS)
-            
-            top = (new_height - target_size[1]) // 2
-            image = image.crop((0, top, target_size[0], top + target_size[1]))
+            return int(target_size[1] * img_ratio), target_size[1]
+        return target_size[0], int(target_size[0] / img_ratio)
+    
+    def _draft_for_target(self, image: Image.Image, target_size: Tuple[int, int]) -> None:
+        # For JPEGs, libjpeg picks the smallest 1/2, 1/4 or 1/8 DCT scale whose
+        # output still covers the requested size; other formats ignore this.
+        if image.format == 'JPEG':
+            image.draft('RGB', self._cover_size(image.size, target_size))
+    
+    def _smart_resize(self, image: Image.Image, target_size: Tuple[int, int],
+                      crop_mode: Optional[str] = None) -> Image.Image:
+        image = self._cover_resize(image, target_size)
+        return image.crop(self._crop_box(image, target_size, crop_mode))
+    
+    def _cover_resize(self, image: Image.Image, target_size: Tuple[int, int]) -> Image.Image:
+        return image.resize(self._cover_size(image.size, target_size), Image.Resampling.LANCZOS,
+                            reducing_gap=self.resize_reducing_gap)
+    
+    def _crop_box(self, image: Image.Image, target_size: Tuple[int, int],
+                  crop_mode: Optional[str] = None) -> Tuple[int, int, int, int]:
+        # `image` is already cover-sized, so the window only slides along one axis.
+        free_x, free_y = image.width - target_size[0], image.height - target_size[1]
+        offset_x, offset_y = 0.5, 0.5
+        if (crop_mode or self.crop_mode) == 'saliency' and (free_x or free_y):
+            saliency = saliency_map(image, self.saliency_size)
+            window = (max(1, round(target_size[0] * saliency.shape[1] / image.width)),
+                      max(1, round(target_size[1] * saliency.shape[0] / image.height)))
+            offset_x, offset_y = best_window_offset(saliency, window, self.saliency_center_bias)
         
-        return image
+        left = free_x // 2 if offset_x == 0.5 else round(offset_x * free_x)
+        top = free_y // 2 if offset_y == 0.5 else round(offset_y * free_y)
+        return left, top, left + target_size[0], top + target_size[1]
+    
+    def _source_box(self, box: Tuple[int, int, int, int], size: Tuple[int, int],
+                    source_size: Tuple[int, int]) -> Tuple[int, int, int, int]:
+        # Maps a crop box on a resized frame back to original pixel coordinates.
+        scale_x, scale_y = source_size[0] / size[0], source_size[1] / size[1]
+        return (round(box[0] * scale_x), round(box[1] * scale_y),
+                min(source_size[0], round(box[2] * scale_x)), min(source_size[1], round(box[3] * scale_y)))
+    
+    def _crop_settings(self) -> dict:
+        crop = {'mode': self.crop_mode}
+        if self.crop_mode == 'saliency':
+            crop.update(size=self.saliency_size, center_bias=self.saliency_center_bias)
+        return crop
+    
+    def _contain_size(self, size: Tuple[int, int], box: Tuple[int, int]) -> Tuple[int, int]:
+        scale = min(box[0] / size[0], box[1] / size[1])
+        return max(1, round(size[0] * scale)), max(1, round(size[1] * scale))
+    
+    def _rendition_resize_size(self, size: Tuple[int, int], config: dict) -> Tuple[int, int]:
+        if config.get('fit', 'cover') == 'cover':
+            return self._cover_size(size, config['size'])
+        return self._contain_size(size, config['size'])
+    
+    def _build_pyramid(self, image: Image.Image, smallest: Tuple[int, int]) -> List[Image.Image]:
+        pyramid = [image]
+        while pyramid[-1].width // 2 >= smallest[0] and pyramid[-1].height // 2 >= smallest[1]:
+            pyramid.append(pyramid[-1].reduce(2))
+        return pyramid
+    
+    def _nearest_pyramid_level(self, pyramid: List[Image.Image], size: Tuple[int, int]) -> Tuple[int, Image.Image]:
+        # The smallest level that still covers the requested size, so the final
+        # LANCZOS step always downsamples by less than 2x.
+        for index in range(len(pyramid) - 1, -1, -1):
+            level = pyramid[index]
+            if level.width >= size[0] and level.height >= size[1]:
+                return index, level
+        return 0, pyramid[0]
     
     def _optimize_for_web(self, image: Image.Image) -> Image.Image:
         if image.mode != 'RGB':
@@ -170,66 +1144,271 @@ class PropertyImageProcessor:
     
     def get_image_stats(self, image_path: str) -> dict:
         try:
-            image = Image.open(image_path)
+            header = read_image_header(image_path)
             file_size = os.path.getsize(image_path)
+            width, height = header['dimensions']
             
             return {
-                'dimensions': image.size,
-                'mode': image.mode,
-                'format': image.format,
+                'dimensions': header['dimensions'],
+                'mode': header['mode'],
+                'format': header['format'],
+                'orientation': header['orientation'],
                 'file_size_mb': round(file_size / (1024 * 1024), 2),
-                'aspect_ratio': round(image.width / image.height, 2)
+                'aspect_ratio': round(width / height, 2)
             }
         except Exception as e:
             return {'error': str(e)}
     
-    def process_batch(self, input_dir: str, output_dir: str, enhancement_level: str = 'medium') -> dict:
-        os.makedirs(output_dir, exist_ok=True)
+    def frame_digest(self, image_path: str, enhancement_level: str = 'medium') -> str:
+        # Names the enhanced, resized frame process_image encodes; quality and
+        # format changes keep the digest, so work keyed on it survives them.
+        frame_key = self._frame_memo_keys(hash_file(image_path), enhancement_level)[1]
+        return hashlib.sha256(json.dumps(frame_key).encode('utf-8')).hexdigest()
+    
+    def perceptual_hash(self, image_source) -> int:
+        start = image_source.tell() if hasattr(image_source, 'tell') else None
+        try:
+            with self._open_image(image_source) as image:
+                return dhash(image)
+        finally:
+            if start is not None:
+                image_source.seek(start)
+    
+    def find_near_duplicates(self, image_sources: Dict[str, object],
+                             workers: Optional[int] = None) -> Dict[str, Tuple[str, int]]:
+        # The first image of each group is its representative. Unreadable
+        # images are left out so processing reports their real error.
+        names, sources = list(image_sources), list(image_sources.values())
+        workers = min(workers or 1, len(sources))
+        if workers > 1 and all(isinstance(source, str) for source in sources):
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                values = list(executor.map(self._perceptual_hash_or_none, sources,
+                                           chunksize=max(1, len(sources) // (workers * 4))))
+        else:
+            values = [self._perceptual_hash_or_none(source) for source in sources]
+        hashes = {name: value for name, value in zip(names, values) if value is not None}
+        return group_near_duplicates(hashes, self.duplicate_threshold)
+    
+    def _perceptual_hash_or_none(self, image_source) -> Optional[int]:
+        try:
+            return self.perceptual_hash(image_source)
+        except Exception:
+            return None
+    
+    def process_batch(self, input_dir: str, output_dir: str, enhancement_level: str = 'medium',
+                      workers: Optional[int] = None, duplicates: Optional[str] = None) -> dict:
+        summary = BatchSummary(enhancement_level)
         results = {}
         
+        for filename, metadata in self.iter_batch(input_dir, output_dir, enhancement_level, workers, summary,
+                                                  duplicates):
+            results[filename] = metadata
+        
+        summary_dict = summary.to_dict()
+        if self.cache is not None:
+            summary_dict['cache'] = self.cache.get_stats()
+        
+        return {
+            'summary': summary_dict,
+            'results': {filename: results[filename] for filename in sorted(results)}
+        }
+    
+    def iter_batch(self, input_dir: str, output_dir: str, enhancement_level: str = 'medium',
+                   workers: Optional[int] = None, summary: Optional[BatchSummary] = None,
+                   duplicates: Optional[str] = None) -> Iterator[Tuple[str, dict]]:
+        # Yields (filename, metadata) as each image finishes; a BatchSummary is
+        # updated before each yield. duplicates is 'skip', 'reuse' or None.
+        if duplicates not in (None, 'skip', 'reuse'):
+            raise Exception(f"Unknown duplicates mode '{duplicates}'")
+        os.makedirs(output_dir, exist_ok=True)
+        
         supported_formats = ('.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.webp')
-        image_files = [f for f in os.listdir(input_dir) if f.lower().endswith(supported_formats)]
+        image_files = sorted(f for f in os.listdir(input_dir) if f.lower().endswith(supported_formats))
         
-        total_original_size = 0
-        total_final_size = 0
-        successful_count = 0
+        if summary is not None:
+            summary.total_images += len(image_files)
         
+        extension = self._encoder(self._effective_format(self.pipeline))['extension']
+        jobs = []
         for filename in image_files:
             input_path = os.path.join(input_dir, filename)
-            output_filename = os.path.splitext(filename)[0] + '_processed.jpg'
-            output_path = os.path.join(output_dir, output_filename)
-            
-            print(f"🔄 Processing: {filename}")
-            metadata = self.process_image(input_path, output_path, enhancement_level)
-            
+            output_filename = os.path.splitext(filename)[0] + '_processed' + extension
+            jobs.append((filename, input_path, os.path.join(output_dir, output_filename)))
+        
+        duplicate_of = {}
+        if duplicates:
+            duplicate_of = self.find_near_duplicates({filename: input_path for filename, input_path, _ in jobs},
+                                                     workers or os.cpu_count())
+            print(f"🔍 Found {len(duplicate_of)} near-duplicate images")
+        
+        unique_jobs = [job for job in jobs if job[0] not in duplicate_of]
+        results = self._run_batch_jobs(unique_jobs, enhancement_level, workers)
+        if duplicate_of:
+            results = self._expand_duplicates(results, jobs, duplicate_of, duplicates)
+        
+        for filename, metadata in results:
             if metadata['status'] == 'success':
-                successful_count += 1
-                total_original_size += metadata['original_file_size']
-                total_final_size += metadata['final_file_size']
-                print(f"Success: {filename} -> {output_filename}")
+                print(f"Success: {filename} -> {os.path.basename(metadata['output_path'])}")
+            elif metadata['status'] == 'skipped':
+                print(f"Skipped: {filename} - near-duplicate of {metadata['duplicate_of']}")
             else:
                 print(f"Failed: {filename} - {metadata.get('error', 'Unknown error')}")
             
-            results[filename] = metadata
+            if summary is not None:
+                summary.update(metadata)
+            yield filename, metadata
+    
+    def _expand_duplicates(self, results: Iterator[Tuple[str, dict]], jobs: List[Tuple[str, str, str]],
+                           duplicate_of: Dict[str, Tuple[str, int]], mode: str) -> Iterator[Tuple[str, dict]]:
+        # Each duplicate is yielded right after its representative finishes.
+        followers = {}
+        for filename, input_path, output_path in jobs:
+            if filename in duplicate_of:
+                followers.setdefault(duplicate_of[filename][0], []).append((filename, input_path, output_path))
         
-        overall_compression = 0
-        if total_original_size > 0:
-            overall_compression = (1 - total_final_size / total_original_size) * 100
-        
-        summary = {
-            'total_images': len(image_files),
-            'successful': successful_count,
-            'failed': len(image_files) - successful_count,
-            'total_original_size_mb': round(total_original_size / (1024 * 1024), 2),
-            'total_final_size_mb': round(total_final_size / (1024 * 1024), 2),
-            'overall_compression_ratio': f"{overall_compression:.1f}%",
-            'enhancement_level': enhancement_level
-        }
+        for filename, metadata in results:
+            yield filename, metadata
+            for duplicate, input_path, output_path in followers.get(filename, []):
+                yield duplicate, self._duplicate_metadata(metadata, filename, duplicate_of[duplicate][1],
+                                                          input_path, output_path, mode)
+    
+    def _duplicate_metadata(self, representative_metadata: dict, representative: str, distance: int,
+                            input_path: str, output_path: str, mode: str) -> dict:
+        duplicate_info = {'duplicate_of': representative, 'hamming_distance': distance}
+        if mode == 'skip':
+            return dict(status='skipped', input_path=input_path, **duplicate_info)
+        if representative_metadata['status'] != 'success':
+            return dict(self._error_metadata(input_path, f"Near-duplicate of {representative}, which failed: "
+                                                         f"{representative_metadata.get('error', 'Unknown error')}"),
+                        **duplicate_info)
         
-        return {
-            'summary': summary,
-            'results': results
-        }
+        try:
+            shutil.copyfile(representative_metadata['output_path'], output_path)
+            original_size = os.path.getsize(input_path)
+        except Exception as e:
+            return dict(self._error_metadata(input_path, e), **duplicate_info)
+        
+        metadata = {key: value for key, value in representative_metadata.items()
+                    if key not in ('stage_timings_ms', 'cache_hit')}
+        metadata.update(duplicate_info)
+        metadata['original_file_size'] = original_size
+        metadata['compression_ratio'] = f"{(1 - metadata['final_file_size'] / original_size) * 100:.1f}%"
+        metadata['output_path'] = output_path
+        return metadata
+    
+    def _run_batch_jobs(self, jobs: List[Tuple[str, str, str]], enhancement_level: str,
+                        workers: Optional[int] = None) -> Iterator[Tuple[str, dict]]:
+        # Results come back in completion order, two jobs per worker in flight.
+        # A dead worker breaks the pool; its in-flight jobs are retried alone.
+        workers = min(workers or os.cpu_count() or 1, len(jobs))
+        
+        if workers <= 1:
+            for filename, input_path, output_path in jobs:
+                print(f"🔄 Processing: {filename}")
+                yield filename, self.process_image(input_path, output_path, enhancement_level)
+            return
+        
+        pending = deque(jobs)
+        while pending:
+            suspects = []
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                in_flight = {}
+                while (pending or in_flight) and not suspects:
+                    while pending and len(in_flight) < workers * 2:
+                        filename, input_path, output_path = pending.popleft()
+                        print(f"🔄 Processing: {filename}")
+                        cache_key, outcome = self._batch_cache_lookup(input_path, output_path, enhancement_level)
+                        job = (filename, input_path, output_path, cache_key)
+                        if outcome is None:
+                            try:
+                                in_flight[self._submit_uncached(executor, job, enhancement_level)] = job
+                                continue
+                            except BrokenProcessPool:
+                                suspects.append(job)
+                                break
+                            except Exception as e:
+                                outcome = self._error_metadata(input_path, f"Worker failed: {str(e)}")
+                        yield filename, outcome
+                    
+                    yield from self._collect_completed(in_flight, suspects)
+                yield from self._collect_completed(in_flight, suspects, ALL_COMPLETED)
+            
+            if suspects:
+                print(f"⚠️ A worker process died; retrying {len(suspects)} in-flight images one at a time")
+                yield from self._run_isolated(suspects, enhancement_level)
+    
+    def _collect_completed(self, in_flight: dict, suspects: list,
+                           return_when: str = FIRST_COMPLETED) -> Iterator[Tuple[str, dict]]:
+        # Jobs lost to a broken pool go to suspects instead of being failed.
+        if not in_flight:
+            return
+        done, _ = wait(in_flight, return_when=return_when)
+        for future in done:
+            filename, input_path, output_path, cache_key = job = in_flight.pop(future)
+            try:
+                metadata = future.result()
+            except BrokenProcessPool:
+                suspects.append(job)
+                continue
+            except Exception as e:
+                metadata = self._error_metadata(input_path, f"Worker failed: {str(e)}")
+            yield filename, self._merge_worker_metadata(metadata)
+    
+    def _run_isolated(self, jobs: List[Tuple[str, str, str, Optional[str]]],
+                      enhancement_level: str) -> Iterator[Tuple[str, dict]]:
+        # One image per single-worker pool, so a crash names its image.
+        executor = None
+        try:
+            for job in jobs:
+                filename, input_path = job[:2]
+                executor = executor or ProcessPoolExecutor(max_workers=1)
+                try:
+                    metadata = self._submit_uncached(executor, job, enhancement_level).result()
+                except BrokenProcessPool:
+                    metadata = self._error_metadata(input_path, "Worker failed: the worker process died while "
+                                                                "processing this image")
+                    executor.shutdown()
+                    executor = None
+                except Exception as e:
+                    metadata = self._error_metadata(input_path, f"Worker failed: {str(e)}")
+                yield filename, self._merge_worker_metadata(metadata)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+    
+    def _submit_uncached(self, executor: ProcessPoolExecutor, job: Tuple[str, str, str, Optional[str]],
+                         enhancement_level: str) -> Future:
+        _, input_path, output_path, cache_key = job
+        return executor.submit(self._process_image_uncached, input_path, output_path, enhancement_level,
+                               self.pipeline, cache_key)
+    
+    def _merge_worker_metadata(self, metadata: dict) -> dict:
+        # Replays the stage events a worker deferred, adopts the byte-budget
+        # qualities it found and counts its cache store.
+        if '_cache_change' in metadata:
+            self.cache.merge(metadata.pop('_cache_change'))
+        for event in metadata.pop('_stage_events', []):
+            for callback in self.stage_callbacks:
+                callback(event)
+        for memo_key, quality in metadata.pop('_learned_qualities', []):
+            self._quality_memo[memo_key] = quality
+            self._quality_memo.move_to_end(memo_key)
+        while len(self._quality_memo) > self.quality_memo_size:
+            self._quality_memo.popitem(last=False)
+        return metadata
+    
+    def _batch_cache_lookup(self, input_path: str, output_path: str,
+                            enhancement_level: str) -> Tuple[Optional[str], Optional[dict]]:
+        # Cache lookups happen in the parent so hits never reach the pool and
+        # the hit/miss counters stay accurate; workers only store new entries.
+        # Returns the key plus, for a hit or a hashing error, the final metadata.
+        if self.cache is None:
+            return None, None
+        try:
+            cache_key = self._cache_key(input_path, enhancement_level, self.pipeline)
+        except Exception as e:
+            return None, self._error_metadata(input_path, e)
+        return cache_key, self._fetch_cached(cache_key, output_path)
 
 def main():
     processor = PropertyImageProcessor(target_size=(1080, 810), quality=85)
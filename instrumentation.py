@@ -0,0 +1,103 @@
+import os
+import json
+import time
+import logging
+from typing import Callable, Dict, List, Optional
+
+from PIL import Image
+
+StageCallback = Callable[[dict], None]
+
+
+class StageRecorder:
+    # Collects one event per pipeline stage for a single image. Timings are
+    # always kept for the metadata dict; callbacks only run when registered,
+    # so an uninstrumented processor pays two perf_counter calls per stage.
+
+    def __init__(self, image_path: str, callbacks: Optional[List[StageCallback]] = None):
+        self.image_path = image_path
+        self.callbacks = callbacks or []
+        self.events = []
+
+    def run(self, stage: str, func, *args, **kwargs):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        pixels = result.width * result.height if isinstance(result, Image.Image) else None
+        self.record(stage, time.perf_counter() - start, pixels=pixels)
+        return result
+
+    def record(self, stage: str, seconds: float, pixels: Optional[int] = None,
+               bytes_read: int = 0, bytes_written: int = 0) -> None:
+        event = {
+            'image': self.image_path,
+            'stage': stage,
+            'duration_ms': round(seconds * 1000, 3),
+            'pixels': pixels,
+            'bytes_read': bytes_read,
+            'bytes_written': bytes_written
+        }
+        self.events.append(event)
+        for callback in self.callbacks:
+            callback(event)
+
+    def timings_ms(self) -> Dict[str, float]:
+        timings = {}
+        for event in self.events:
+            timings[event['stage']] = round(timings.get(event['stage'], 0) + event['duration_ms'], 1)
+        return timings
+
+
+class LoggingSink:
+
+    def __init__(self, logger: Optional[logging.Logger] = None, level: int = logging.INFO):
+        self.logger = logger or logging.getLogger('realtygenie.pipeline')
+        self.level = level
+
+    def __call__(self, event: dict) -> None:
+        self.logger.log(self.level, "%s %s %.1f ms pixels=%s read=%d written=%d",
+                        os.path.basename(event['image']), event['stage'], event['duration_ms'],
+                        event['pixels'], event['bytes_read'], event['bytes_written'])
+
+
+class StageAggregator:
+
+    def __init__(self):
+        self.stages = {}
+
+    def __call__(self, event: dict) -> None:
+        stats = self.stages.setdefault(event['stage'], {
+            'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'pixels': 0, 'bytes_read': 0, 'bytes_written': 0
+        })
+        stats['count'] += 1
+        stats['total_ms'] += event['duration_ms']
+        stats['max_ms'] = max(stats['max_ms'], event['duration_ms'])
+        stats['pixels'] += event['pixels'] or 0
+        stats['bytes_read'] += event['bytes_read']
+        stats['bytes_written'] += event['bytes_written']
+
+    def get_summary(self) -> Dict[str, dict]:
+        grand_total = sum(stats['total_ms'] for stats in self.stages.values()) or 1.0
+        summary = {}
+        for stage, stats in self.stages.items():
+            summary[stage] = dict(
+                stats,
+                total_ms=round(stats['total_ms'], 1),
+                mean_ms=round(stats['total_ms'] / stats['count'], 2),
+                share=f"{stats['total_ms'] / grand_total * 100:.1f}%"
+            )
+        return summary
+
+    def reset(self) -> None:
+        self.stages = {}
+
+
+class JsonLinesSink:
+    # Opens in append mode per event: each line is a single small write, so
+    # several processes can share one file without interleaving lines.
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def __call__(self, event: dict) -> None:
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(dict(event, timestamp=time.time())) + '\n')
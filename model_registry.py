@@ -0,0 +1,86 @@
+import gc
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+
+def _rss_mb() -> Optional[float]:
+    # Current resident set size from /proc (Linux); None elsewhere.
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+class ModelRegistry:
+    # Process-wide store of loaded models. Each key is loaded at most once,
+    # even when several Streamlit sessions or threads ask for it at the same
+    # time: loads take a per-key lock, so other keys and already-loaded
+    # models are never blocked behind a slow from_pretrained().
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._models = {}
+        self._stats = {}
+
+    def get(self, key: str, loader: Callable[[], object]) -> object:
+        model = self._models.get(key)
+        if model is not None:
+            return model
+
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            if key not in self._models:
+                rss_before = _rss_mb()
+                start = time.perf_counter()
+                model = loader()
+                load_seconds = time.perf_counter() - start
+                rss_after = _rss_mb()
+                self._models[key] = model
+                self._stats[key] = {
+                    'load_seconds': round(load_seconds, 2),
+                    'rss_delta_mb': round(rss_after - rss_before, 1) if rss_before is not None else None,
+                    'rss_after_mb': rss_after,
+                    'loaded_at': time.strftime('%Y-%m-%dT%H:%M:%S')
+                }
+                print(f"🤖 Loaded {key} in {load_seconds:.1f}s"
+                      + (f" (+{rss_after - rss_before:.0f} MB RSS)" if rss_before is not None else ""))
+            return self._models[key]
+
+    def warm_up(self, key: str, loader: Callable[[], object]) -> dict:
+        self.get(key, loader)
+        return self.stats().get(key, {})
+
+    def unload(self, key: Optional[str] = None) -> None:
+        # Drops the registry's reference; the memory is returned once no
+        # caller still holds the model. None unloads everything. Takes each
+        # key's lock, so a load in flight finishes before it is dropped.
+        with self._lock:
+            keys = list(self._key_locks) if key is None else [key]
+            key_locks = [self._key_locks.setdefault(name, threading.Lock()) for name in keys]
+        for name, key_lock in zip(keys, key_locks):
+            with key_lock:
+                self._models.pop(name, None)
+                self._stats.pop(name, None)
+        gc.collect()
+        try:
+            import torch
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+        except ImportError:
+            pass
+
+    def is_loaded(self, key: str) -> bool:
+        return key in self._models
+
+    def stats(self) -> Dict[str, dict]:
+        return {key: dict(stats) for key, stats in self._stats.items()}
+
+
+registry = ModelRegistry()
@@ -0,0 +1,307 @@
+import os
+import json
+import inspect
+from typing import List, Optional
+
+import numpy as np
+
+VISION_FILE = 'vision_encoder.onnx'
+DECODER_FILE = 'text_decoder.onnx'
+META_FILE = 'export.json'
+
+
+def onnx_export_dir(model_name: str, root: str) -> str:
+    import transformers
+    return os.path.join(root, 'onnx', f"{model_name.replace('/', '--')}-transformers{transformers.__version__}")
+
+
+def export_blip_onnx(model, export_dir: str, opset: int = 17) -> dict:
+    # Two graphs: the vision encoder (pixel_values -> image embeddings) and
+    # one text decoder step that takes and returns the self-attention
+    # key/values, so each new token only runs the decoder on that token.
+    # The first step feeds zero-length past tensors. Files are written to a
+    # temporary directory and renamed, so a half-finished export is never used.
+    import torch
+
+    model = model.eval().float()
+    vision_encoder, decoder_step = _export_wrappers(model)
+    text_config = model.config.text_config
+    layers, heads = text_config.num_hidden_layers, text_config.num_attention_heads
+    head_dim = text_config.hidden_size // heads
+    image_size = model.config.vision_config.image_size
+    past_names = [f"past_{layer}_{kind}" for layer in range(layers) for kind in ('key', 'value')]
+    present_names = [f"present_{layer}_{kind}" for layer in range(layers) for kind in ('key', 'value')]
+
+    temp_dir = f"{export_dir}.{os.getpid()}.tmp"
+    os.makedirs(temp_dir, exist_ok=True)
+    # Newer torch defaults to the dynamo exporter; the traced one handles the
+    # past key/values rebuilt inside the decoder step.
+    options = {'dynamo': False} if 'dynamo' in inspect.signature(torch.onnx.export).parameters else {}
+
+    pixel_values = torch.randn(1, 3, image_size, image_size)
+    with torch.no_grad():
+        torch.onnx.export(
+            vision_encoder, (pixel_values,), os.path.join(temp_dir, VISION_FILE),
+            input_names=['pixel_values'], output_names=['image_embeds'],
+            dynamic_axes={'pixel_values': {0: 'batch'}, 'image_embeds': {0: 'batch'}},
+            opset_version=opset, do_constant_folding=True, **options
+        )
+        image_embeds = model.vision_model(pixel_values=pixel_values)[0]
+
+        # Traced with one past position and two new tokens so neither length
+        # gets baked in as a constant.
+        input_ids = torch.full((1, 2), text_config.bos_token_id, dtype=torch.long)
+        attention_mask = torch.ones(1, 3, dtype=torch.long)
+        past = [torch.zeros(1, heads, 1, head_dim) for _ in past_names]
+        dynamic_axes = {
+            'input_ids': {0: 'batch', 1: 'new_tokens'},
+            'attention_mask': {0: 'batch', 1: 'total_tokens'},
+            'encoder_hidden_states': {0: 'batch'},
+            'logits': {0: 'batch', 1: 'new_tokens'}
+        }
+        dynamic_axes.update({name: {0: 'batch', 2: 'past_tokens'} for name in past_names})
+        dynamic_axes.update({name: {0: 'batch', 2: 'total_tokens'} for name in present_names})
+        torch.onnx.export(
+            decoder_step, (input_ids, attention_mask, image_embeds, *past),
+            os.path.join(temp_dir, DECODER_FILE),
+            input_names=['input_ids', 'attention_mask', 'encoder_hidden_states'] + past_names,
+            output_names=['logits'] + present_names,
+            dynamic_axes=dynamic_axes, opset_version=opset, do_constant_folding=True, **options
+        )
+
+    meta = {
+        'layers': layers,
+        'heads': heads,
+        'head_dim': head_dim,
+        'image_size': image_size,
+        'bos_token_id': text_config.bos_token_id,
+        'sep_token_id': text_config.sep_token_id,
+        'pad_token_id': text_config.pad_token_id,
+        'opset': opset
+    }
+    with open(os.path.join(temp_dir, META_FILE), 'w') as f:
+        json.dump(meta, f, indent=2)
+
+    if os.path.isdir(export_dir):
+        import shutil
+        shutil.rmtree(export_dir)
+    os.replace(temp_dir, export_dir)
+    return meta
+
+
+def _export_wrappers(model):
+    # Built on demand so importing this module does not need torch.
+    import torch
+    from transformers.models.blip import modeling_blip_text
+
+    # transformers 5 BLIP only takes Cache objects, 4.x BLIP only tuples.
+    cache_class = getattr(modeling_blip_text, 'EncoderDecoderCache', None)
+
+    class VisionEncoder(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.vision_model = model.vision_model
+
+        def forward(self, pixel_values):
+            return self.vision_model(pixel_values=pixel_values)[0]
+
+    class TextDecoderStep(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.text_decoder = model.text_decoder
+
+        def forward(self, input_ids, attention_mask, encoder_hidden_states, *past):
+            pairs = [(past[index], past[index + 1]) for index in range(0, len(past), 2)]
+            if cache_class is None:
+                past_key_values = tuple(pairs)
+            else:
+                # The cross-attention cache starts empty every step, so it is
+                # recomputed from the image embeddings as in the tuple path.
+                from transformers import DynamicCache
+                past_key_values = cache_class(DynamicCache(), DynamicCache())
+                for layer, (key, value) in enumerate(pairs):
+                    past_key_values.self_attention_cache.update(key, value, layer)
+            outputs = self.text_decoder(
+                input_ids=input_ids, attention_mask=attention_mask, encoder_hidden_states=encoder_hidden_states,
+                past_key_values=past_key_values, use_cache=True, return_dict=True
+            )
+            present = outputs.past_key_values
+            if cache_class is not None:
+                present = [(layer.keys, layer.values) for layer in present.self_attention_cache.layers]
+            # Only the self-attention key/values; cross-attention over the
+            # image embeddings is recomputed each step.
+            return (outputs.logits, *[tensor for layer in present for tensor in layer[:2]])
+
+    return VisionEncoder().eval(), TextDecoderStep().eval()
+
+
+def tiny_blip_model(seed: int = 0):
+    # Randomly initialised BLIP small enough to export and decode in seconds
+    # without downloading weights; used by benchmarks.py onnx_parity.
+    import torch
+    from transformers import BlipConfig, BlipForConditionalGeneration
+
+    torch.manual_seed(seed)
+    config = BlipConfig(
+        vision_config={'hidden_size': 32, 'intermediate_size': 64, 'num_hidden_layers': 2,
+                       'num_attention_heads': 4, 'image_size': 32, 'patch_size': 8},
+        text_config={'vocab_size': 99, 'hidden_size': 32, 'intermediate_size': 64, 'num_hidden_layers': 2,
+                     'num_attention_heads': 4, 'max_position_embeddings': 64,
+                     'bos_token_id': 1, 'sep_token_id': 2, 'pad_token_id': 0}
+    )
+    return BlipForConditionalGeneration(config).eval()
+
+
+class OnnxBlipCaptioner:
+    # Runs the exported graphs with ONNX Runtime and decodes in NumPy,
+    # mirroring BlipForConditionalGeneration.generate: the prompt's first
+    # token becomes BOS, its trailing [SEP] is dropped, and [SEP] ends a caption.
+
+    def __init__(self, export_dir: str, threads: Optional[int] = None):
+        try:
+            import onnxruntime
+        except ImportError:
+            raise Exception("The ONNX caption backend needs onnxruntime: pip install onnxruntime")
+
+        with open(os.path.join(export_dir, META_FILE)) as f:
+            self.meta = json.load(f)
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        providers = ['CPUExecutionProvider']
+        self.vision = onnxruntime.InferenceSession(os.path.join(export_dir, VISION_FILE), options, providers=providers)
+        self.decoder = onnxruntime.InferenceSession(os.path.join(export_dir, DECODER_FILE), options, providers=providers)
+        self.past_names = [f"past_{layer}_{kind}" for layer in range(self.meta['layers']) for kind in ('key', 'value')]
+
+    @staticmethod
+    def is_exported(export_dir: str) -> bool:
+        return all(os.path.exists(os.path.join(export_dir, name)) for name in (VISION_FILE, DECODER_FILE, META_FILE))
+
+    def generate(self, pixel_values: np.ndarray, input_ids: Optional[np.ndarray] = None, max_new_tokens: int = 60,
+                 num_beams: int = 1, length_penalty: float = 1.0, early_stopping: bool = True) -> np.ndarray:
+        image_embeds = self.vision.run(None, {'pixel_values': pixel_values.astype(np.float32)})[0]
+        batch = image_embeds.shape[0]
+        if input_ids is None:
+            input_ids = np.tile([[self.meta['bos_token_id'], self.meta['sep_token_id']]], (batch, 1))
+        input_ids = np.array(input_ids, dtype=np.int64)
+        input_ids[:, 0] = self.meta['bos_token_id']
+        input_ids = input_ids[:, :-1]
+
+        if num_beams > 1:
+            return self._beam_search(input_ids, image_embeds, max_new_tokens, num_beams, length_penalty, early_stopping)
+        return self._greedy(input_ids, image_embeds, max_new_tokens)
+
+    def _empty_past(self, rows: int) -> List[np.ndarray]:
+        shape = (rows, self.meta['heads'], 0, self.meta['head_dim'])
+        return [np.zeros(shape, dtype=np.float32) for _ in self.past_names]
+
+    def _step(self, tokens: np.ndarray, total_length: int, image_embeds: np.ndarray, past: List[np.ndarray]):
+        feeds = {
+            'input_ids': tokens,
+            'attention_mask': np.ones((tokens.shape[0], total_length), dtype=np.int64),
+            'encoder_hidden_states': image_embeds
+        }
+        feeds.update(zip(self.past_names, past))
+        logits, *present = self.decoder.run(None, feeds)
+        return logits[:, -1], present
+
+    def _greedy(self, input_ids: np.ndarray, image_embeds: np.ndarray, max_new_tokens: int) -> np.ndarray:
+        sep, pad = self.meta['sep_token_id'], self.meta['pad_token_id']
+        sequences, tokens = input_ids, input_ids
+        past = self._empty_past(input_ids.shape[0])
+        finished = np.zeros(input_ids.shape[0], dtype=bool)
+
+        for _ in range(max_new_tokens):
+            logits, past = self._step(tokens, sequences.shape[1], image_embeds, past)
+            next_tokens = np.where(finished, pad, logits.argmax(axis=-1))
+            sequences = np.concatenate([sequences, next_tokens[:, None]], axis=1)
+            finished |= next_tokens == sep
+            if finished.all():
+                break
+            tokens = next_tokens[:, None]
+        return sequences
+
+    def _beam_search(self, input_ids: np.ndarray, image_embeds: np.ndarray, max_new_tokens: int, beams: int,
+                     length_penalty: float, early_stopping: bool) -> np.ndarray:
+        # Standard beam search over batch * beams rows. Each step keeps the
+        # best `beams` continuations per image out of 2 * beams candidates;
+        # candidates ending in [SEP] become finished hypotheses scored by
+        # log-probability / generated_length ** length_penalty, where the
+        # generated length counts the [SEP] but not the prompt. As in
+        # transformers' BeamSearchScorer, a [SEP] ranked below the top
+        # `beams` candidates is dropped rather than finished.
+        sep, pad = self.meta['sep_token_id'], self.meta['pad_token_id']
+        batch, prompt_length = input_ids.shape
+        image_embeds = np.repeat(image_embeds, beams, axis=0)
+        sequences = np.repeat(input_ids, beams, axis=0)
+        tokens = sequences
+        past = self._empty_past(batch * beams)
+        # Only the first beam is live at the start, or every beam would pick
+        # the same tokens.
+        beam_scores = np.full((batch, beams), -1e9, dtype=np.float32)
+        beam_scores[:, 0] = 0.0
+        hypotheses = [[] for _ in range(batch)]
+        done = np.zeros(batch, dtype=bool)
+
+        for _ in range(max_new_tokens):
+            logits, past = self._step(tokens, sequences.shape[1], image_embeds, past)
+            logits = logits.astype(np.float32)
+            log_probs = logits - logits.max(axis=-1, keepdims=True)
+            log_probs -= np.log(np.exp(log_probs).sum(axis=-1, keepdims=True))
+            vocab = log_probs.shape[-1]
+            scores = (beam_scores.reshape(-1, 1) + log_probs).reshape(batch, beams * vocab)
+            candidates = np.argpartition(-scores, 2 * beams, axis=1)[:, :2 * beams]
+            order = np.argsort(-np.take_along_axis(scores, candidates, axis=1), axis=1)
+            candidates = np.take_along_axis(candidates, order, axis=1)
+
+            rows, next_tokens, next_scores = [], [], []
+            for index in range(batch):
+                chosen = []
+                if not done[index]:
+                    for rank, candidate in enumerate(candidates[index]):
+                        row, token = index * beams + candidate // vocab, candidate % vocab
+                        score = scores[index, candidate]
+                        if token == sep:
+                            if rank < beams:
+                                hypothesis = np.append(sequences[row], token)
+                                generated = hypothesis.shape[0] - prompt_length
+                                hypotheses[index].append((score / generated ** length_penalty, hypothesis))
+                        else:
+                            chosen.append((row, token, score))
+                        if len(chosen) == beams:
+                            break
+                    if early_stopping and len(hypotheses[index]) >= beams:
+                        done[index] = True
+                if done[index] or len(chosen) < beams:
+                    chosen = [(index * beams + beam, pad, -1e9) for beam in range(beams)]
+                for row, token, score in chosen:
+                    rows.append(row)
+                    next_tokens.append(token)
+                    next_scores.append(score)
+
+            if done.all():
+                break
+            rows = np.array(rows)
+            next_tokens = np.array(next_tokens, dtype=np.int64)
+            sequences = np.concatenate([sequences[rows], next_tokens[:, None]], axis=1)
+            past = [tensor[rows] for tensor in past]
+            beam_scores = np.array(next_scores, dtype=np.float32).reshape(batch, beams)
+            tokens = next_tokens[:, None]
+
+        best = []
+        for index in range(batch):
+            if not hypotheses[index] or not done[index]:
+                for beam in range(beams):
+                    score = beam_scores[index, beam]
+                    if score > -1e8:
+                        sequence = sequences[index * beams + beam]
+                        hypotheses[index].append((score / (sequence.shape[0] - prompt_length) ** length_penalty,
+                                                  sequence))
+            best.append(max(hypotheses[index], key=lambda item: item[0])[1] if hypotheses[index] else input_ids[index])
+
+        length = max(sequence.shape[0] for sequence in best)
+        output = np.full((batch, length), pad, dtype=np.int64)
+        for index, sequence in enumerate(best):
+            output[index, :sequence.shape[0]] = sequence
+        return output
@@ -1,31 +1,154 @@
 import torch
+import transformers
 from transformers import BlipProcessor, BlipForConditionalGeneration
 from PIL import Image
 import os
 import json
+import argparse
 import re
 import random
-from typing import Dict, List
+import statistics
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from image_cache import CaptionCache
+from model_registry import registry as model_registry
+
+BLIP_MODEL_NAME = "Salesforce/blip-image-captioning-base"
+QUANTIZED_MODEL_DIR = '.model_cache'
+CAPTION_BACKENDS = ('torch', 'onnx')
+
+# Cheapest to strongest. None of them sample: with do_sample=True the
+# 8-beam search was paying for beams it then mostly threw away.
+DECODING_PRESETS = {
+    'fast': {'max_new_tokens': 30, 'num_beams': 1, 'do_sample': False},
+    'balanced': {'max_new_tokens': 40, 'num_beams': 3, 'do_sample': False, 'early_stopping': True},
+    'quality': {'max_new_tokens': 60, 'num_beams': 8, 'do_sample': False, 'early_stopping': True}
+}
+
+
+def load_blip(model_name: str, device: str, quantized_dir: Optional[str] = None):
+    # With quantized_dir (CPU only), the vision encoder and text decoder get
+    # dynamic int8 Linear layers. Their state_dict is saved there and loaded
+    # back with weights_only=True on later starts, so the cache directory
+    # only ever supplies tensors, never pickled code.
+    print("Loading BLIP model...")
+    processor = BlipProcessor.from_pretrained(model_name)
+    
+    model = BlipForConditionalGeneration.from_pretrained(
+        model_name,
+        dtype=torch.float16 if device == "cuda" else torch.float32,
+        low_cpu_mem_usage=True,
+        use_safetensors=True
+    ).to(device)
+    
+    quantized_path = _quantized_model_path(model_name, quantized_dir) if quantized_dir else None
+    if quantized_path:
+        model = _quantize_blip(model)
+        loaded = False
+        if os.path.exists(quantized_path):
+            try:
+                model.load_state_dict(torch.load(quantized_path, weights_only=True))
+                loaded = True
+                print(f"Loaded int8 weights from {quantized_path}")
+            except Exception as e:
+                print(f"⚠️ Could not load {quantized_path} ({e}), quantizing again")
+                model = _quantize_blip(BlipForConditionalGeneration.from_pretrained(
+                    model_name, dtype=torch.float32, low_cpu_mem_usage=True, use_safetensors=True
+                ))
+        if not loaded:
+            os.makedirs(quantized_dir, exist_ok=True)
+            temp_path = f"{quantized_path}.{os.getpid()}.tmp"
+            torch.save(model.state_dict(), temp_path)
+            os.replace(temp_path, quantized_path)
+            print(f"Saved int8 weights to {quantized_path}")
+    
+    model.eval()
+    print("Model loaded successfully!")
+    return processor, model
+
+def load_blip_onnx(model_name: str, export_root: str):
+    # Exports the vision encoder and text decoder once per model and
+    # transformers version; later starts only read the ONNX files and never
+    # load the PyTorch weights.
+    from onnx_captioning import OnnxBlipCaptioner, export_blip_onnx, onnx_export_dir
+    print("Loading BLIP ONNX backend...")
+    processor = BlipProcessor.from_pretrained(model_name)
+    
+    export_dir = onnx_export_dir(model_name, export_root)
+    if not OnnxBlipCaptioner.is_exported(export_dir):
+        print(f"Exporting {model_name} to ONNX (one-off)...")
+        model = BlipForConditionalGeneration.from_pretrained(
+            model_name, dtype=torch.float32, low_cpu_mem_usage=True, use_safetensors=True
+        )
+        export_blip_onnx(model, export_dir)
+        del model
+        print(f"Saved ONNX graphs to {export_dir}")
+    
+    captioner = OnnxBlipCaptioner(export_dir)
+    print("Model loaded successfully!")
+    return processor, captioner
+
+def _quantize_blip(model):
+    for name in ('vision_model', 'text_decoder'):
+        submodule = torch.ao.quantization.quantize_dynamic(getattr(model, name), {torch.nn.Linear}, dtype=torch.qint8)
+        setattr(model, name, submodule)
+    return model
+
+def _quantized_model_path(model_name: str, quantized_dir: str) -> str:
+    # Keyed on the model and library versions, so an upgrade never loads
+    # weights quantized for different modules.
+    versions = f"torch{torch.__version__}-transformers{transformers.__version__}".replace('+', '_')
+    return os.path.join(quantized_dir, f"{model_name.replace('/', '--')}-int8-{versions}.state_dict.pt")
 
 class PropertyDescriptionGenerator:
     
-    def __init__(self):
-        self.device = "cuda" if torch.cuda.is_available() else "cpu"
-        print(f"Using device: {self.device.upper()}")
-        
-        model_name = "Salesforce/blip-image-captioning-base"
-        print("Loading BLIP model...")
-        
-        self.processor = BlipProcessor.from_pretrained(model_name)
-        self.model = BlipForConditionalGeneration.from_pretrained(
-            model_name,
-            dtype=torch.float16 if self.device == "cuda" else torch.float32,
-            low_cpu_mem_usage=True,
-            use_safetensors=True
-        ).to(self.device)
-        
-        self.model.eval()
-        print("Model loaded successfully!")
+    def __init__(self, model_name: str = BLIP_MODEL_NAME, quantize: bool = False,
+                 quantized_dir: str = QUANTIZED_MODEL_DIR, backend: str = 'torch',
+                 decoding_preset: str = 'balanced', caption_cache: Optional[CaptionCache] = None):
+        if backend not in CAPTION_BACKENDS:
+            raise Exception(f"Unknown caption backend '{backend}', expected one of {CAPTION_BACKENDS}")
+        if decoding_preset not in DECODING_PRESETS:
+            raise Exception(f"Unknown decoding preset '{decoding_preset}', expected one of {tuple(DECODING_PRESETS)}")
+        self.backend = backend
+        # The ONNX backend runs on ONNX Runtime's CPU provider.
+        self.device = "cuda" if torch.cuda.is_available() and backend == 'torch' else "cpu"
+        print(f"Using device: {self.device.upper()}" + (" (ONNX Runtime)" if backend == 'onnx' else ""))
+        
+        # Opt-in dynamic int8 quantization; PyTorch only has CPU kernels for it.
+        if quantize and backend == 'onnx':
+            print("⚠️ int8 quantization applies to the torch backend, using the float32 ONNX graphs")
+            quantize = False
+        if quantize and self.device != "cpu":
+            print("⚠️ int8 quantization is CPU-only, using the float16 GPU model")
+            quantize = False
+        self.quantize = quantize
+        self.quantized_dir = quantized_dir
+        
+        # Weights live in the process-wide registry, so every generator (each
+        # Streamlit session, the CLI, benchmarks) shares one loaded copy.
+        self.model_name = model_name
+        self.model_key = f"blip:{model_name}:{self.device}" + (":int8" if quantize else "") + \
+            (":onnx" if backend == 'onnx' else "")
+        model_registry.get(self.model_key, self._load_model)
+        
+        self.caption_prompt = "A beautiful property featuring"
+        self.decoding_preset = decoding_preset
+        # Recent generate() times keyed by (preset, images per call), used to
+        # pick the strongest preset that fits a latency budget. Batch sizes
+        # get separate windows: a call's per-image share shrinks as it grows.
+        # Streamlit shares one generator across sessions, hence the lock.
+        self.preset_timings = {}
+        self._timings_lock = threading.Lock()
+        # Optional persistent store of raw captions; see image_cache.CaptionCache.
+        self.caption_cache = caption_cache
+        # Images per generate() call, and threads for decoding and BLIP
+        # preprocessing (PIL decodes and resizes outside the GIL).
+        self.batch_size = 4
+        self.preprocess_workers = min(4, os.cpu_count() or 1)
         
         self.room_mapping = {
             'living room': 'spacious living area',
@@ -44,47 +167,241 @@ class PropertyDescriptionGenerator:
             'nice': ['lovely', 'attractive', 'appealing', 'inviting']
         }
     
-    def generate_description(self, image_path: str, style: str = 'luxury', use_conditional=True) -> Dict[str, str]:
-        try:
-            image = Image.open(image_path).convert("RGB")
-            
-            if use_conditional:
-                prompt = "A beautiful property featuring"
-                inputs = self.processor(image, prompt, return_tensors="pt").to(self.device)
-            else:
-                inputs = self.processor(images=image, return_tensors="pt").to(self.device)
-            
+    @property
+    def processor(self):
+        return model_registry.get(self.model_key, self._load_model)[0]
+    
+    @property
+    def model(self):
+        return model_registry.get(self.model_key, self._load_model)[1]
+    
+    def _load_model(self):
+        if self.backend == 'onnx':
+            return load_blip_onnx(self.model_name, self.quantized_dir)
+        return load_blip(self.model_name, self.device, self.quantized_dir if self.quantize else None)
+    
+    def warm_up(self, run_inference: bool = True) -> dict:
+        # Loads the weights if needed and optionally captions one blank image,
+        # so the first real batch doesn't pay for allocator and kernel setup.
+        # Returns the load time and resident memory from the registry.
+        stats = model_registry.warm_up(self.model_key, self._load_model)
+        if run_inference:
+            pixel_values = self._blank_pixel_values()
+            if self.backend == 'onnx':
+                self.model.generate(pixel_values.numpy(), max_new_tokens=5)
+                return stats
             with torch.no_grad():
-                out = self.model.generate(
-                    **inputs,
-                    max_new_tokens=60,
-                    num_beams=8,
-                    early_stopping=True,
-                    temperature=0.8,
-                    do_sample=True,
-                    top_p=0.9
-                )
-            
-            raw_caption = self.processor.decode(out[0], skip_special_tokens=True)
-            
-            if use_conditional and raw_caption.startswith("A beautiful property featuring"):
-                raw_caption = raw_caption.replace("A beautiful property featuring", "").strip()
-            
-            descriptions = {}
-            descriptions['raw'] = raw_caption
-            descriptions['basic'] = raw_caption
-            descriptions['enhanced'] = self._enhance_description(raw_caption)
-            descriptions['luxury'] = self._generate_luxury_description(raw_caption)
-            descriptions['family'] = self._generate_family_description(raw_caption)
-            descriptions['investment'] = self._generate_investment_description(raw_caption)
-            descriptions['social'] = self._generate_social_description(raw_caption)
-            
-            descriptions['primary'] = descriptions.get(style, descriptions['luxury'])
-            
-            return descriptions
-            
+                self.model.generate(pixel_values=pixel_values.to(self.device, self._input_dtype()), max_new_tokens=5)
+        return stats
+    
+    def _blank_pixel_values(self):
+        image = Image.new('RGB', (384, 384), 'white')
+        return self.processor.image_processor(image, return_tensors="pt")['pixel_values']
+    
+    def preset_latency_ms(self, preset: str, batch_size: int = 1) -> Optional[float]:
+        # Per-image share of a generate() call over batch_size images.
+        with self._timings_lock:
+            timings = list(self.preset_timings.get((preset, batch_size), ()))
+        return round(statistics.median(timings) / batch_size, 1) if timings else None
+    
+    def _record_preset_timing(self, preset: str, batch_size: int, elapsed_ms: float) -> None:
+        with self._timings_lock:
+            self.preset_timings.setdefault((preset, batch_size), deque(maxlen=20)).append(elapsed_ms)
+    
+    def calibrate_presets(self, presets: Optional[List[str]] = None,
+                          batch_size: int = 1) -> Dict[str, Optional[float]]:
+        # Times one call over batch_size blank images per preset. Blank images
+        # give short captions, so this is a lower bound; real captions replace
+        # it in the rolling window as they are generated. The first
+        # calibration warms the model up so one-off setup isn't timed.
+        if not self.preset_timings:
+            self.warm_up()
+        pixel_values = self._blank_pixel_values()
+        for name in presets or DECODING_PRESETS:
+            start = time.perf_counter()
+            self._caption_batch([pixel_values] * batch_size, True, DECODING_PRESETS[name])
+            self._record_preset_timing(name, batch_size, (time.perf_counter() - start) * 1000)
+        return {name: self.preset_latency_ms(name, batch_size) for name in DECODING_PRESETS}
+    
+    def choose_preset(self, latency_budget_ms: Optional[float] = None, batch_size: int = 1) -> str:
+        # The strongest preset whose measured per-image time, at this batch
+        # size, fits the budget, or 'fast' when none does. Presets are tried
+        # cheapest first and an unmeasured one is calibrated only once the
+        # cheaper ones fit, so a tight budget never pays for an 8-beam
+        # calibration run.
+        if latency_budget_ms is None:
+            return self.decoding_preset
+        chosen = next(iter(DECODING_PRESETS))
+        for name in DECODING_PRESETS:
+            if self.preset_latency_ms(name, batch_size) is None:
+                self.calibrate_presets([name], batch_size)
+            if self.preset_latency_ms(name, batch_size) > latency_budget_ms:
+                break
+            chosen = name
+        return chosen
+    
+    def _input_dtype(self):
+        # Quantized models keep float32 activations.
+        return torch.float32 if self.quantize else self.model.dtype
+    
+    def unload(self) -> None:
+        # Frees the shared weights for every generator in the process; the
+        # next caption loads them again.
+        model_registry.unload(self.model_key)
+    
+    def model_stats(self) -> Optional[dict]:
+        return model_registry.stats().get(self.model_key)
+    
+    def generate_description(self, image_path: str, style: str = 'luxury', use_conditional=True,
+                             preset: Optional[str] = None, latency_budget_ms: Optional[float] = None) -> Dict[str, str]:
+        return self.generate_descriptions_batch([image_path], style, use_conditional, batch_size=1, preset=preset,
+                                                latency_budget_ms=latency_budget_ms)[image_path]
+    
+    def generate_descriptions_batch(self, image_paths: List[str], style: str = 'luxury', use_conditional=True,
+                                    batch_size: Optional[int] = None,
+                                    progress_callback: Optional[Callable[[int, int], None]] = None,
+                                    preset: Optional[str] = None,
+                                    latency_budget_ms: Optional[float] = None,
+                                    content_keys: Optional[Dict[str, str]] = None) -> Dict[str, Dict[str, str]]:
+        # One generate() call per batch of images: pixel_values are stacked so
+        # the vision encoder and the beam search run as batched matmuls.
+        # Results are keyed by path in input order; an image that fails to load
+        # gets its own error entry without failing the rest of its batch.
+        # An explicit preset wins; otherwise latency_budget_ms (per image) is
+        # re-checked before every batch against the latest timings.
+        # content_keys (path -> key) replace the file hash in the caption cache.
+        if preset is not None and preset not in DECODING_PRESETS:
+            raise Exception(f"Unknown decoding preset '{preset}', expected one of {tuple(DECODING_PRESETS)}")
+        batch_size = batch_size or self.batch_size
+        results = {}
+        
+        with ThreadPoolExecutor(max_workers=self.preprocess_workers) as executor:
+            for start in range(0, len(image_paths), batch_size):
+                batch = image_paths[start:start + batch_size]
+                try:
+                    name = preset or self.choose_preset(latency_budget_ms, len(batch))
+                    self._describe_batch(batch, name, style, use_conditional, executor, results, content_keys)
+                except Exception as e:
+                    for image_path in batch:
+                        results.setdefault(image_path, {'error': f"Failed to generate description: {str(e)}"})
+                
+                if progress_callback is not None:
+                    progress_callback(min(start + batch_size, len(image_paths)), len(image_paths))
+        
+        return {image_path: results[image_path] for image_path in image_paths}
+    
+    def _describe_batch(self, batch: List[str], preset: str, style: str, use_conditional: bool,
+                        executor: ThreadPoolExecutor, results: Dict[str, Dict[str, str]],
+                        content_keys: Optional[Dict[str, str]] = None) -> None:
+        # Cached captions only re-render the style templates; the rest are
+        # preprocessed, captioned in one generate() call and stored.
+        cache_keys = {}
+        if self.caption_cache is not None:
+            pending = []
+            for image_path in batch:
+                key = self._caption_cache_key(image_path, preset, use_conditional, (content_keys or {}).get(image_path))
+                raw_caption = self.caption_cache.fetch(key) if key else None
+                if raw_caption is None:
+                    cache_keys[image_path] = key
+                    pending.append(image_path)
+                else:
+                    results[image_path] = self._build_descriptions(raw_caption, style)
+                    results[image_path].update(decoding_preset=preset, caption_cache='hit')
+            batch = pending
+        
+        pixel_values = []
+        for image_path, outcome in zip(batch, executor.map(self._preprocess_image, batch)):
+            if isinstance(outcome, Exception):
+                results[image_path] = {'error': f"Failed to generate description: {str(outcome)}"}
+            else:
+                pixel_values.append((image_path, outcome))
+        if not pixel_values:
+            return
+        
+        start = time.perf_counter()
+        captions = self._caption_batch([values for _, values in pixel_values], use_conditional,
+                                       DECODING_PRESETS[preset])
+        self._record_preset_timing(preset, len(pixel_values), (time.perf_counter() - start) * 1000)
+        for (image_path, _), raw_caption in zip(pixel_values, captions):
+            results[image_path] = self._build_descriptions(raw_caption, style)
+            results[image_path]['decoding_preset'] = preset
+            if cache_keys.get(image_path):
+                self.caption_cache.store(cache_keys[image_path], raw_caption)
+                results[image_path]['caption_cache'] = 'miss'
+    
+    def _caption_cache_key(self, image_path: str, preset: str, use_conditional: bool,
+                           content_key: Optional[str] = None):
+        # The registry key names the weights variant (device, int8, ONNX), all
+        # of which caption slightly differently.
+        try:
+            return self.caption_cache.make_key(image_path, self.model_key,
+                                               self.caption_prompt if use_conditional else '', preset, content_key)
+        except OSError:
+            return None
+    
+    def _preprocess_image(self, image_path: str):
+        try:
+            with Image.open(image_path) as image:
+                # BLIP works at 384x384, so JPEGs can decode at a reduced DCT scale.
+                size = self.processor.image_processor.size
+                image.draft('RGB', (size['width'], size['height']))
+                image = image.convert("RGB")
+            return self.processor.image_processor(image, return_tensors="pt")['pixel_values']
         except Exception as e:
-            return {'error': f"Failed to generate description: {str(e)}"}
+            return e
+    
+    def _caption_batch(self, pixel_values: List, use_conditional: bool = True,
+                       settings: Optional[dict] = None) -> List[str]:
+        settings = settings or DECODING_PRESETS[self.decoding_preset]
+        if self.backend == 'onnx':
+            out = self._onnx_generate(pixel_values, use_conditional, settings)
+        else:
+            out = self._torch_generate(pixel_values, use_conditional, settings)
+        
+        captions = self.processor.batch_decode(out, skip_special_tokens=True)
+        if use_conditional:
+            captions = [caption.replace(self.caption_prompt, "").strip() if caption.startswith(self.caption_prompt)
+                        else caption for caption in captions]
+        return captions
+    
+    def _torch_generate(self, pixel_values: List, use_conditional: bool, settings: dict):
+        inputs = {'pixel_values': torch.cat(pixel_values).to(self.device, self._input_dtype())}
+        if use_conditional:
+            text = self.processor.tokenizer([self.caption_prompt] * len(pixel_values), return_tensors="pt")
+            inputs['input_ids'] = text['input_ids'].to(self.device)
+            inputs['attention_mask'] = text['attention_mask'].to(self.device)
+        
+        with torch.no_grad():
+            return self.model.generate(**inputs, **settings)
+    
+    def _onnx_generate(self, pixel_values: List, use_conditional: bool, settings: dict):
+        # Greedy or beam search only: sampling settings (do_sample,
+        # temperature, top_p) are not used by the ONNX decoder.
+        input_ids = None
+        if use_conditional:
+            input_ids = self.processor.tokenizer([self.caption_prompt] * len(pixel_values),
+                                                 return_tensors="np")['input_ids']
+        return self.model.generate(
+            torch.cat(pixel_values).numpy(), input_ids,
+            max_new_tokens=settings.get('max_new_tokens', 60),
+            num_beams=settings.get('num_beams', 1),
+            length_penalty=settings.get('length_penalty', 1.0),
+            early_stopping=settings.get('early_stopping', True)
+        )
+    
+    def _build_descriptions(self, raw_caption: str, style: str = 'luxury') -> Dict[str, str]:
+        descriptions = {}
+        descriptions['raw'] = raw_caption
+        descriptions['basic'] = raw_caption
+        descriptions['enhanced'] = self._enhance_description(raw_caption)
+        descriptions['luxury'] = self._generate_luxury_description(raw_caption)
+        descriptions['family'] = self._generate_family_description(raw_caption)
+        descriptions['investment'] = self._generate_investment_description(raw_caption)
+        descriptions['social'] = self._generate_social_description(raw_caption)
+        
+        descriptions['primary'] = descriptions.get(style, descriptions['luxury'])
+        
+        return descriptions
     
     def _enhance_description(self, description: str) -> str:
         description = description.lower().strip()
@@ -336,30 +653,35 @@ class PropertyDescriptionGenerator:
         
         return f"{starter} {short_desc} {hashtags}"
     
-    def process_all_images(self, image_dir: str, output_dir: str) -> Dict[str, Dict]:
+    def process_all_images(self, image_dir: str, output_dir: str, batch_size: Optional[int] = None,
+                           preset: Optional[str] = None, latency_budget_ms: Optional[float] = None) -> Dict[str, Dict]:
         os.makedirs(output_dir, exist_ok=True)
         results = {}
         
         supported_formats = ('.jpg', '.jpeg', '.png', '.bmp', '.tiff')
+        filenames = [filename for filename in os.listdir(image_dir) if filename.lower().endswith(supported_formats)]
+        image_paths = [os.path.join(image_dir, filename) for filename in filenames]
         
-        for filename in os.listdir(image_dir):
-            if filename.lower().endswith(supported_formats):
-                image_path = os.path.join(image_dir, filename)
+        batch_results = self.generate_descriptions_batch(image_paths, batch_size=batch_size, preset=preset,
+                                                         latency_budget_ms=latency_budget_ms)
+        
+        for filename, image_path in zip(filenames, image_paths):
+            descriptions = batch_results[image_path]
+            try:
+                if 'error' in descriptions:
+                    raise Exception(descriptions['error'])
                 
-                try:
-                    descriptions = self.generate_description(image_path)
-                    
-                    output_file = os.path.join(output_dir, f"{filename}_description.txt")
-                    with open(output_file, 'w', encoding='utf-8') as f:
-                        f.write(f"Enhanced: {descriptions['enhanced']}\\n")
-                        f.write(f"Raw: {descriptions['raw']}")
-                    
-                    results[filename] = descriptions
-                    print(f"{filename}: {descriptions['enhanced']}")
-                    
-                except Exception as e:
-                    results[filename] = {'error': str(e)}
-                    print(f" Error processing {filename}: {e}")
+                output_file = os.path.join(output_dir, f"{filename}_description.txt")
+                with open(output_file, 'w', encoding='utf-8') as f:
+                    f.write(f"Enhanced: {descriptions['enhanced']}\\n")
+                    f.write(f"Raw: {descriptions['raw']}")
+                
+                results[filename] = descriptions
+                print(f"{filename}: {descriptions['enhanced']}")
+                
+            except Exception as e:
+                results[filename] = {'error': str(e)}
+                print(f" Error processing {filename}: {e}")
         
         results_file = os.path.join(output_dir, 'property_descriptions.json')
         with open(results_file, 'w', encoding='utf-8') as f:
@@ -368,10 +690,23 @@ class PropertyDescriptionGenerator:
         return results
 
 def main():
-    generator = PropertyDescriptionGenerator()
+    parser = argparse.ArgumentParser(description="Generate property descriptions for processed images")
+    parser.add_argument('--preset', choices=list(DECODING_PRESETS), default='balanced',
+                        help="caption decoding preset (default: balanced)")
+    parser.add_argument('--latency-budget-ms', type=float,
+                        help="per-image caption budget; picks the strongest preset that fits instead of --preset")
+    parser.add_argument('--backend', choices=CAPTION_BACKENDS, default='torch')
+    parser.add_argument('--no-caption-cache', action='store_true',
+                        help="always run the model instead of reusing captions from .caption_cache.db")
+    args = parser.parse_args()
+    
+    caption_cache = None if args.no_caption_cache else CaptionCache()
+    generator = PropertyDescriptionGenerator(backend=args.backend, decoding_preset=args.preset,
+                                             caption_cache=caption_cache)
     
     print("\\nGenerating enhanced property descriptions...")
-    results = generator.process_all_images('processed_images', 'descriptions')
+    results = generator.process_all_images('processed_images', 'descriptions',
+                                           latency_budget_ms=args.latency_budget_ms)
     
     print(f"\\n Generated descriptions for {len(results)} images")
     print(" Results saved to descriptions/ folder")
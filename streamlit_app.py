@@ -15,8 +15,10 @@ import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import base64
 
-from image_processor import PropertyImageProcessor
-from property_descriptions import PropertyDescriptionGenerator
+from image_cache import CaptionCache
+from image_processor import PropertyImageProcessor, read_image_header
+from property_descriptions import BLIP_MODEL_NAME, PropertyDescriptionGenerator
+from model_registry import registry as model_registry
 from social_media_automation import SocialMediaGenerator
 
 # Page configuration
@@ -202,7 +204,13 @@ def init_session_state():
             'image_quality': 85,
             'target_width': 1080,
             'target_height': 810,
-            'enhancement_level': 'medium'
+            'enhancement_level': 'medium',
+            'duplicate_handling': 'process',
+            'crop_mode': 'saliency',
+            'quantized_captions': False,
+            'caption_backend': 'torch',
+            'decoding_preset': 'balanced',
+            'caption_budget_ms': 0
         },
         'last_settings': {
             'image_quality': 85,
@@ -321,10 +329,12 @@ def create_upload_section():
         cols = st.columns(min(4, len(uploaded_files)))
         for idx, file in enumerate(uploaded_files):
             with cols[idx % 4]:
-                image = Image.open(file)
-                st.image(image, caption=file.name, width='stretch')
-                image = Image.open(file)
-                st.image(image, caption=file.name, width='stretch')
+                try:
+                    width, height = read_image_header(file)['display_dimensions']
+                    caption = f"{file.name} · {width}×{height}"
+                except Exception:
+                    caption = file.name
+                st.image(file.getvalue(), caption=caption, width='stretch')
     
     return uploaded_files
 
@@ -364,6 +374,31 @@ def create_processing_section():
         if st.button(button_text, type="primary", width='stretch'):
             process_images()
 
+def get_image_processor():
+    # Kept for the whole session so its frame memo survives reruns: after a
+    # quality change, "Reprocess" only re-encodes the enhanced frames.
+    if 'image_processor' not in st.session_state:
+        st.session_state.image_processor = PropertyImageProcessor(
+            target_size=(1080, 810),
+            quality=st.session_state.user_preferences['image_quality'],
+            memory_budget_mb=1024,
+            frame_memo_mb=256
+        )
+    return st.session_state.image_processor
+
+@st.cache_resource
+def get_caption_cache():
+    # Raw captions persist across restarts, so re-uploading a listing only
+    # re-renders the description templates.
+    return CaptionCache()
+
+@st.cache_resource(show_spinner="🤖 Loading the captioning model (first run only)...")
+def get_description_generator(quantize: bool = False, backend: str = 'torch'):
+    # One generator per mode for every session and rerun; the BLIP weights
+    # themselves sit in the process-wide model registry, so scripts in this
+    # process share them.
+    return PropertyDescriptionGenerator(quantize=quantize, backend=backend, caption_cache=get_caption_cache())
+
 def process_images():
     try:
         # Display current settings for debugging
@@ -376,11 +411,11 @@ def process_images():
             temp_dir = tempfile.mkdtemp()
             st.session_state.temp_dir = temp_dir
             
-            image_processor = PropertyImageProcessor(
-                target_size=(1080, 810), 
-                quality=st.session_state.user_preferences['image_quality']
-            )
-            desc_generator = PropertyDescriptionGenerator()
+            image_processor = get_image_processor()
+            image_processor.quality = st.session_state.user_preferences['image_quality']
+            image_processor.crop_mode = st.session_state.user_preferences.get('crop_mode', 'saliency')
+            desc_generator = get_description_generator(st.session_state.user_preferences['quantized_captions'],
+                                                       st.session_state.user_preferences.get('caption_backend', 'torch'))
             social_generator = SocialMediaGenerator()
             
             results = {}
@@ -389,16 +424,46 @@ def process_images():
             progress_bar = st.progress(0)
             status_text = st.empty()
             
+            # Burst shots and re-exports of the same photo are enhanced and
+            # captioned once; the first upload of each group is the representative.
+            duplicate_handling = st.session_state.user_preferences.get('duplicate_handling', 'process')
+            duplicate_of = {}
+            if duplicate_handling != 'process':
+                status_text.text("Checking for near-duplicate uploads...")
+                duplicate_of = image_processor.find_near_duplicates(
+                    {uploaded_file.name: uploaded_file for uploaded_file in st.session_state.uploaded_files}
+                )
+            skipped = []
+            reuse_of = {}
+            processed = {}
+            enhancement_level = st.session_state.user_preferences['enhancement_level'].lower()
+            
+            # Images are enhanced one by one first; captions then run in
+            # batches over all processed images (one BLIP generate() per batch).
             for idx, uploaded_file in enumerate(st.session_state.uploaded_files):
                 current_file = f"Processing {idx + 1}/{total_files}: {uploaded_file.name}"
                 status_text.text(current_file)
                 
+                if uploaded_file.name in duplicate_of:
+                    representative = duplicate_of[uploaded_file.name][0]
+                    if duplicate_handling == 'skip':
+                        skipped.append(uploaded_file.name)
+                        progress_bar.progress((idx + 1) / (2 * total_files))
+                        continue
+                    
+                    if representative in processed:
+                        original_path = os.path.join(temp_dir, f"original_{uploaded_file.name}")
+                        with open(original_path, "wb") as f:
+                            f.write(uploaded_file.getbuffer())
+                        reuse_of[uploaded_file.name] = (representative, original_path)
+                        progress_bar.progress((idx + 1) / (2 * total_files))
+                        continue
+                
                 try:
                     original_path = os.path.join(temp_dir, f"original_{uploaded_file.name}")
                     with open(original_path, "wb") as f:
                         f.write(uploaded_file.getbuffer())
                     
-                    enhancement_level = st.session_state.user_preferences['enhancement_level'].lower()
                     processing_metadata = image_processor.process_image(
                         original_path, 
                         enhancement_level=enhancement_level
@@ -407,50 +472,7 @@ def process_images():
                     if processing_metadata['status'] != 'success':
                         raise Exception(f"Image processing failed: {processing_metadata.get('error', 'Unknown error')}")
                     
-                    processed_path = processing_metadata['output_path']
-                    
-                    descriptions = desc_generator.generate_description(processed_path, style='luxury')
-                    
-                    if 'error' in descriptions:
-                        st.warning(f"⚠️ Description generation failed for {uploaded_file.name}: {descriptions['error']}")
-                        descriptions = {
-                            'luxury': f"Beautiful property featuring stunning architecture and modern amenities.",
-                            'family': f"Perfect family home with spacious rooms and comfortable living areas.",
-                            'investment': f"Excellent investment opportunity in a prime location.",
-                            'social': f"🏡 STUNNING PROPERTY! Beautiful home with modern features. #RealEstate #DreamHome",
-                            'basic': "Property image"
-                        }
-                    
-                    social_posts = {}
-                    platforms = ['instagram', 'facebook', 'twitter', 'linkedin']
-                    
-                    for platform in platforms:
-                        try:
-                            post_data = social_generator.generate_post(
-                                descriptions.get('luxury', 'Beautiful property'), 
-                                uploaded_file.name, 
-                                platform
-                            )
-                            social_posts[platform] = post_data
-                        except Exception as e:
-                            st.warning(f"Social media generation failed for {platform}: {str(e)}")
-                            social_posts[platform] = {
-                                'content': f"🏡 Beautiful property! Contact us for details. #RealEstate",
-                                'platform': platform,
-                                'error': str(e)
-                            }
-                    
-                    results[uploaded_file.name] = {
-                        'original_path': original_path,
-                        'processed_path': processed_path,
-                        'processing_metadata': processing_metadata,
-                        'descriptions': descriptions,
-                        'social_posts': social_posts,
-                        'processing_time': datetime.now().isoformat(),
-                        'enhancement_level': enhancement_level,
-                        'file_size_reduction': processing_metadata.get('compression_ratio', 'N/A'),
-                        'status': 'success'
-                    }
+                    processed[uploaded_file.name] = (original_path, processing_metadata)
                     
                 except Exception as e:
                     st.error(f"Failed to process {uploaded_file.name}: {str(e)}")
@@ -464,7 +486,83 @@ def process_images():
                         'error_message': str(e)
                     }
                 
-                progress_bar.progress((idx + 1) / total_files)
+                progress_bar.progress((idx + 1) / (2 * total_files))
+            
+            status_text.text(f"Generating descriptions for {len(processed)} images...")
+            caption_budget = st.session_state.user_preferences.get('caption_budget_ms', 0)
+            # Cached captions are keyed on the frame before encoding, so a
+            # quality-only change re-encodes without re-running BLIP.
+            content_keys = {
+                metadata['output_path']: image_processor.frame_digest(original_path, enhancement_level)
+                for original_path, metadata in processed.values()
+            }
+            all_descriptions = desc_generator.generate_descriptions_batch(
+                [metadata['output_path'] for _, metadata in processed.values()],
+                style='luxury',
+                progress_callback=lambda done, total: progress_bar.progress(0.5 + done / (2 * total)),
+                preset=None if caption_budget else st.session_state.user_preferences.get('decoding_preset', 'balanced'),
+                latency_budget_ms=caption_budget or None,
+                content_keys=content_keys
+            )
+            
+            for name, (original_path, processing_metadata) in processed.items():
+                processed_path = processing_metadata['output_path']
+                descriptions = all_descriptions[processed_path]
+                
+                if 'error' in descriptions:
+                    st.warning(f"⚠️ Description generation failed for {name}: {descriptions['error']}")
+                    descriptions = {
+                        'luxury': f"Beautiful property featuring stunning architecture and modern amenities.",
+                        'family': f"Perfect family home with spacious rooms and comfortable living areas.",
+                        'investment': f"Excellent investment opportunity in a prime location.",
+                        'social': f"🏡 STUNNING PROPERTY! Beautiful home with modern features. #RealEstate #DreamHome",
+                        'basic': "Property image"
+                    }
+                
+                social_posts = {}
+                platforms = ['instagram', 'facebook', 'twitter', 'linkedin']
+                
+                for platform in platforms:
+                    try:
+                        post_data = social_generator.generate_post(
+                            descriptions.get('luxury', 'Beautiful property'), 
+                            name, 
+                            platform
+                        )
+                        social_posts[platform] = post_data
+                    except Exception as e:
+                        st.warning(f"Social media generation failed for {platform}: {str(e)}")
+                        social_posts[platform] = {
+                            'content': f"🏡 Beautiful property! Contact us for details. #RealEstate",
+                            'platform': platform,
+                            'error': str(e)
+                        }
+                
+                results[name] = {
+                    'original_path': original_path,
+                    'processed_path': processed_path,
+                    'processing_metadata': processing_metadata,
+                    'descriptions': descriptions,
+                    'social_posts': social_posts,
+                    'processing_time': datetime.now().isoformat(),
+                    'enhancement_level': enhancement_level,
+                    'file_size_reduction': processing_metadata.get('compression_ratio', 'N/A'),
+                    'status': 'success'
+                }
+            
+            # Burst shots and re-exports get a copy of their representative's result.
+            for name, (representative, original_path) in reuse_of.items():
+                results[name] = dict(
+                    results[representative],
+                    original_path=original_path,
+                    social_posts={platform: dict(post, image_file=name)
+                                  for platform, post in results[representative]['social_posts'].items()},
+                    processing_time=datetime.now().isoformat(),
+                    duplicate_of=representative
+                )
+            # Keep the upload order for the results page.
+            results = {uploaded_file.name: results[uploaded_file.name]
+                       for uploaded_file in st.session_state.uploaded_files if uploaded_file.name in results}
             
             successful_count = sum(1 for r in results.values() if r.get('status') == 'success')
             st.session_state.results = results
@@ -472,6 +570,14 @@ def process_images():
             
             status_text.empty()
             
+            reused = [name for name, result in results.items() if result.get('duplicate_of')]
+            if skipped:
+                st.info(f"⏭️ Skipped {len(skipped)} near-duplicate upload(s): {', '.join(skipped)}")
+            if reused:
+                st.info(f"♻️ Reused results for {len(reused)} near-duplicate upload(s): " +
+                        ', '.join(f"{name} (same shot as {results[name]['duplicate_of']})" for name in reused))
+            total_files -= len(skipped)
+            
             if successful_count == total_files:
                 st.markdown(f"""
                 <div class="container mt-4">
@@ -630,15 +736,16 @@ def create_gallery_view():
         with col1:
             st.markdown("### Original Image")
             if result.get('original_path') and os.path.exists(result['original_path']):
-                original_img = Image.open(result['original_path'])
-                st.image(original_img, width='stretch')
+                original_dimensions = processing_metadata.get('original_dimensions') or \
+                    read_image_header(result['original_path'])['dimensions']
+                st.image(result['original_path'], width='stretch')
                 
                 original_size = os.path.getsize(result['original_path'])
                 st.markdown(f"""
                 <div class="card bg-light">
                     <div class="card-body p-2">
                         <small>
-                            <strong>Original:</strong> {original_img.size[0]}×{original_img.size[1]} | 
+                            <strong>Original:</strong> {original_dimensions[0]}×{original_dimensions[1]} | 
                             {original_size / (1024*1024):.1f} MB
                         </small>
                     </div>
@@ -648,8 +755,9 @@ def create_gallery_view():
         with col2:
             st.markdown("### Enhanced Image")
             if result.get('processed_path') and os.path.exists(result['processed_path']):
-                processed_img = Image.open(result['processed_path'])
-                st.image(processed_img, width='stretch')
+                processed_dimensions = processing_metadata.get('final_dimensions') or \
+                    read_image_header(result['processed_path'])['dimensions']
+                st.image(result['processed_path'], width='stretch')
                 
                 processed_size = os.path.getsize(result['processed_path'])
                 compression_ratio = processing_metadata.get('compression_ratio', 'N/A')
@@ -658,7 +766,7 @@ def create_gallery_view():
                 <div class="card bg-success text-white">
                     <div class="card-body p-2">
                         <small>
-                            <strong>Enhanced:</strong> {processed_img.size[0]}×{processed_img.size[1]} | 
+                            <strong>Enhanced:</strong> {processed_dimensions[0]}×{processed_dimensions[1]} | 
                             {processed_size / (1024*1024):.1f} MB | 
                             {compression_ratio} savings
                         </small>
@@ -928,10 +1036,21 @@ def create_sidebar():
     
     st.sidebar.markdown("### Image Processing")
     quality = st.sidebar.slider("Image Quality", 60, 100, 85, key="quality_slider")
-    enhancement = st.sidebar.selectbox("Enhancement Level", ["light", "medium", "strong"], index=1, key="enhancement_select")
+    enhancement = st.sidebar.selectbox("Enhancement Level", ["light", "medium", "strong", "auto"], index=1,
+                                       key="enhancement_select",
+                                       help="'auto' picks per-photo settings from each image's brightness and color")
+    duplicate_options = {'Process all': 'process', 'Reuse results': 'reuse', 'Skip': 'skip'}
+    duplicate_choice = st.sidebar.selectbox("Near-duplicate Uploads", list(duplicate_options), index=0,
+                                            key="duplicate_select",
+                                            help="Burst shots and re-exports of the same photo are processed once")
+    crop_options = {'Smart (follow detail)': 'saliency', 'Center': 'center'}
+    crop_choice = st.sidebar.selectbox("Crop Framing", list(crop_options), index=0, key="crop_select",
+                                       help="Smart framing keeps the most detailed part of the room in the crop")
     
     st.session_state.user_preferences['image_quality'] = quality
     st.session_state.user_preferences['enhancement_level'] = enhancement
+    st.session_state.user_preferences['duplicate_handling'] = duplicate_options[duplicate_choice]
+    st.session_state.user_preferences['crop_mode'] = crop_options[crop_choice]
     
     st.sidebar.markdown(f"""
     <div class="alert alert-info">
@@ -948,9 +1067,62 @@ def create_sidebar():
         st.session_state.processing_complete = False
         st.rerun()
     
+    create_model_panel()
+    
     # Platform stats
     st.sidebar.markdown("### Supported Platforms")
 
+def create_model_panel():
+    st.sidebar.markdown("### AI Model")
+    st.session_state.user_preferences['quantized_captions'] = st.sidebar.checkbox(
+        "Quantized CPU model (int8)", value=st.session_state.user_preferences['quantized_captions'],
+        key="quantized_checkbox",
+        help="Faster, smaller captioning model for CPU-only machines; captions may differ slightly"
+    )
+    backends = {'torch': 'PyTorch', 'onnx': 'ONNX Runtime'}
+    current_backend = st.session_state.user_preferences.get('caption_backend', 'torch')
+    st.session_state.user_preferences['caption_backend'] = st.sidebar.selectbox(
+        "Inference Backend", list(backends), index=list(backends).index(current_backend),
+        format_func=backends.get, key="backend_select",
+        help="ONNX Runtime exports the model once on first use, then captions without loading PyTorch weights"
+    )
+    presets = {'fast': 'Fast (greedy)', 'balanced': 'Balanced (3 beams)', 'quality': 'Quality (8 beams)'}
+    current_preset = st.session_state.user_preferences.get('decoding_preset', 'balanced')
+    st.session_state.user_preferences['decoding_preset'] = st.sidebar.selectbox(
+        "Caption Quality", list(presets), index=list(presets).index(current_preset),
+        format_func=presets.get, key="preset_select",
+        help="Beam search width used when writing captions; wider is slower"
+    )
+    st.session_state.user_preferences['caption_budget_ms'] = st.sidebar.number_input(
+        "Caption Time Budget (ms per image)", min_value=0, max_value=60000, step=250,
+        value=int(st.session_state.user_preferences.get('caption_budget_ms', 0)), key="budget_input",
+        help="0 uses the preset above; otherwise the strongest preset measured to fit the budget is used"
+    )
+    generator_key = f"blip:{BLIP_MODEL_NAME}:"
+    loaded = {key: stats for key, stats in model_registry.stats().items() if key.startswith(generator_key)}
+    
+    if loaded:
+        for key, stats in loaded.items():
+            rss = f"{stats['rss_delta_mb']:.0f} MB" if stats['rss_delta_mb'] is not None else "n/a"
+            variant = "ONNX" if key.endswith(":onnx") else "int8" if key.endswith(":int8") else "full precision"
+            st.sidebar.caption(f"✅ BLIP ({variant}) loaded in {stats['load_seconds']:.1f}s · {rss} resident")
+        if st.sidebar.button("Unload Model", help="Free the model's memory; the next run loads it again"):
+            model_registry.unload()
+            get_description_generator.clear()
+            st.rerun()
+    else:
+        st.sidebar.caption("BLIP is not loaded yet")
+        if st.sidebar.button("Warm Up Model", help="Load the model now instead of on the first run"):
+            preferences = st.session_state.user_preferences
+            get_description_generator(preferences['quantized_captions'], preferences.get('caption_backend', 'torch')).warm_up()
+            st.rerun()
+    
+    cache_stats = get_caption_cache().get_stats()
+    st.sidebar.caption(f"💾 Caption cache: {cache_stats['entries']} captions · {cache_stats['hit_rate']} hit rate")
+    if cache_stats['entries'] and st.sidebar.button("Clear Caption Cache", help="Caption every image again on the next run"):
+        get_caption_cache().clear()
+        st.rerun()
+
 # Main App
 def main():
     # Initialize session state